@@ -0,0 +1,337 @@
+"""
+Change-feed driven derived views over the opportunities container.
+
+Each view registered in VIEWS receives every changed opportunity document and
+folds it into one or more small state documents (facets, rollups, ...). The
+views are incremental and idempotent: replaying the same document leaves the
+state unchanged, so lease checkpoints only need at-least-once delivery.
+
+The dashboard reads the filter_options view (data_access.get_filter_options)
+instead of running SELECT DISTINCT scans over the opportunities container.
+
+In Azure the views are fed by the Cosmos DB trigger in function_app.py,
+listening on OPPORTUNITIES_CONTAINER - the container the dashboard reads.
+Locally, replay a file of records through the same code:
+
+    python derived_views.py example_records.txt
+"""
+
+import os
+import sys
+import json
+import zlib
+import logging
+import datetime as dt
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List
+
+from azure.core import MatchConditions
+from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+logger = logging.getLogger("derived_views")
+
+VIEWS_CONTAINER = "derived_views"
+# The container the dashboard queries (streamlit/data_access.py reads the same
+# setting). The views are fed from it so filter options match the result set.
+OPPORTUNITIES_CONTAINER = os.getenv("OPPORTUNITIES_CONTAINER", "opportunities")
+
+# ─── View stores ──────────────────────────────────────────────────────────────
+class InMemoryViewStore:
+    """Dict-backed store used for local replays, optionally persisted to a JSON file"""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.docs: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.docs = json.load(f)
+
+    def get(self, view: str, key: str) -> dict | None:
+        doc = self.docs.get(f"{view}:{key}")
+        return json.loads(json.dumps(doc)) if doc is not None else None
+
+    def update(self, view: str, key: str, fn: Callable[[dict], dict | None]) -> dict:
+        current = self.get(view, key) or {"id": f"{view}:{key}", "view": view, "key": key}
+        updated = fn(current)
+        if updated is None:
+            return current
+        self.docs[f"{view}:{key}"] = updated
+        self._save()
+        return updated
+
+    def transact(self, view: str, keys: List[str], fn: Callable[[Dict[str, dict]], Dict[str, dict] | None]):
+        states = {key: self.get(view, key) or {"id": f"{view}:{key}", "view": view, "key": key} for key in keys}
+        updated = fn(states)
+        if updated:
+            for key, doc in updated.items():
+                self.docs[f"{view}:{key}"] = doc
+            self._save()
+
+    def _save(self):
+        if self.path:
+            with open(self.path, "w") as f:
+                json.dump(self.docs, f, indent=2)
+
+class CosmosViewStore:
+    """Stores view state documents in the derived_views container (partitioned by /view)"""
+
+    def __init__(self, container, max_retries: int = 5):
+        self.container = container
+        self.max_retries = max_retries
+
+    def get(self, view: str, key: str) -> dict | None:
+        try:
+            return self.container.read_item(item=f"{view}:{key}", partition_key=view)
+        except CosmosResourceNotFoundError:
+            return None
+
+    def update(self, view: str, key: str, fn: Callable[[dict], dict | None]) -> dict:
+        """Read-modify-write with an etag check, retrying if another writer won"""
+        for _ in range(self.max_retries):
+            current = self.get(view, key)
+            etag = current.get("_etag") if current else None
+            base = current or {"id": f"{view}:{key}", "view": view, "key": key}
+            updated = fn({k: v for k, v in base.items() if not k.startswith("_")})
+            if updated is None:
+                return base
+            try:
+                if etag:
+                    return self.container.replace_item(
+                        item=updated["id"], body=updated,
+                        etag=etag, match_condition=MatchConditions.IfNotModified,
+                    )
+                return self.container.create_item(updated)
+            except (CosmosAccessConditionFailedError, CosmosResourceExistsError):
+                # Another writer got there first; retry from a fresh read
+                continue
+        raise RuntimeError(f"Gave up updating {view}:{key} after {self.max_retries} conflicts")
+
+    def transact(self, view: str, keys: List[str], fn: Callable[[Dict[str, dict]], Dict[str, dict] | None]):
+        """
+        Read-modify-write several state documents of one view atomically: *fn*
+        gets {key: state} and returns the states to write (None to skip). The
+        writes go in one transactional batch with etag checks, retried on conflict.
+        """
+        for _ in range(self.max_retries):
+            current = {key: self.get(view, key) for key in keys}
+            states = {
+                key: {k: v for k, v in (doc or {"id": f"{view}:{key}", "view": view, "key": key}).items()
+                      if not k.startswith("_")}
+                for key, doc in current.items()
+            }
+            updated = fn(states)
+            if not updated:
+                return
+            operations = [
+                ("replace", (doc["id"], doc), {"if_match_etag": current[key]["_etag"]})
+                if current[key] else ("create", (doc,))
+                for key, doc in updated.items()
+            ]
+            try:
+                self.container.execute_item_batch(operations, partition_key=view)
+                return
+            except CosmosBatchOperationError:
+                # An etag or create conflict rolled the batch back; retry from fresh reads
+                continue
+        raise RuntimeError(f"Gave up updating {view}:{keys} after {self.max_retries} conflicts")
+
+def cosmos_view_store() -> CosmosViewStore:
+    client = CosmosClient(
+        url=os.getenv("COSMOS_URL"),
+        credential=os.getenv("COSMOS_KEY"),
+        consistency_level="Session",
+    )
+    db = client.get_database_client("govwin")
+    container = db.create_container_if_not_exists(
+        id=VIEWS_CONTAINER, partition_key=PartitionKey(path="/view")
+    )
+    return CosmosViewStore(container)
+
+# ─── View registry ────────────────────────────────────────────────────────────
+class DerivedView(ABC):
+    """Base class - subclasses fold one changed opportunity into their state"""
+
+    name = ""
+
+    @abstractmethod
+    def apply(self, doc: dict, store) -> None:
+        """Fold *doc* into the view state via ``store.update`` / ``store.transact``;
+        return None from the update function when nothing changed to skip the write"""
+
+VIEWS: Dict[str, DerivedView] = {}
+
+def register_view(cls):
+    """Class decorator that adds a view to the registry"""
+    VIEWS[cls.name] = cls()
+    return cls
+
+def _enabled_views() -> List[DerivedView]:
+    """Views listed in DERIVED_VIEWS (comma-separated), or all registered views"""
+    names = [n.strip() for n in os.getenv("DERIVED_VIEWS", "").split(",") if n.strip()]
+    if not names:
+        return list(VIEWS.values())
+    return [VIEWS[n] for n in names if n in VIEWS]
+
+# ─── Built-in views ───────────────────────────────────────────────────────────
+FILTER_OPTION_SHARDS = 8  # state docs the values are spread over, to avoid one hot document
+
+def _shard(opp_id: str, shards: int) -> int:
+    return zlib.crc32(opp_id.encode()) % shards
+
+@register_view
+class FilterOptionsView(DerivedView):
+    """
+    Distinct values for every dashboard filter, replacing SELECT DISTINCT scans.
+    Each opportunity writes to one of FILTER_OPTION_SHARDS documents (by id
+    hash), so concurrent trigger batches rarely contend on an etag; readers
+    take the union of all shards.
+    """
+
+    name = "filter_options"
+
+    def apply(self, doc, store):
+        values = {
+            "naics": [n.get("id") for n in doc.get("allNAICSCodes") or [] if isinstance(n, dict)],
+            "psc": [doc.get("pscCode")],
+            "status": [doc.get("status")],
+            "sources": [doc.get("source")],
+            # GovWin tracked opportunities put free text in procurement
+            "procurement": [doc.get("procurement")] if doc.get("source") != "GovWin Tracked" else [],
+        }
+        values = {k: [v for v in vs if v] for k, vs in values.items()}
+        if not any(values.values()):
+            return
+
+        def _merge(state):
+            changed = False
+            for field, new_values in values.items():
+                existing = set(state.get(field, []))
+                if not existing.issuperset(new_values):
+                    state[field] = sorted(existing.union(new_values))
+                    changed = True
+            return state if changed else None
+
+        store.update(self.name, f"shard:{_shard(doc['id'], FILTER_OPTION_SHARDS)}", _merge)
+
+@register_view
+class DailyRollupView(DerivedView):
+    """
+    Per-day opportunity counts and value by source, keyed by the day an
+    opportunity was first seen (its partitionDate at first ingest), so a
+    re-ingest on a later day is not counted twice. Day documents hold only
+    totals; a small "opp:<id>" marker per opportunity remembers its day and
+    current contribution, and both are written in one transactional batch.
+    """
+
+    name = "daily_rollup"
+
+    def apply(self, doc, store):
+        marker_key = f"opp:{doc['id']}"
+        seen = store.get(self.name, marker_key)
+        day = (seen or {}).get("day") or doc.get("partitionDate")
+        if not day:
+            return
+        value = doc.get("contractValue")
+        entry = {
+            "source": doc.get("source", "Unknown"),
+            "value": value if isinstance(value, (int, float)) else 0,
+        }
+
+        def _merge(states):
+            marker, rollup = states[marker_key], states[day]
+            old = marker.get("entry")
+            if old == entry:
+                return None
+            by_source = rollup.setdefault("bySource", {})
+            if old:
+                totals = by_source.setdefault(old["source"], {"count": 0, "value": 0})
+                totals["count"] -= 1
+                totals["value"] -= old["value"]
+            totals = by_source.setdefault(entry["source"], {"count": 0, "value": 0})
+            totals["count"] += 1
+            totals["value"] += entry["value"]
+            rollup["bySource"] = {src: t for src, t in by_source.items() if t["count"]}
+            rollup["count"] = sum(t["count"] for t in rollup["bySource"].values())
+            rollup["totalValue"] = sum(t["value"] for t in rollup["bySource"].values())
+            marker.update(day=day, entry=entry)
+            return {marker_key: marker, day: rollup}
+
+        store.transact(self.name, [marker_key, day], _merge)
+
+# ─── Processor ────────────────────────────────────────────────────────────────
+def process_changes(documents: Iterable[dict], store, views: List[DerivedView] | None = None) -> int:
+    """Fold a batch of changed opportunity documents into every enabled view"""
+    views = views if views is not None else _enabled_views()
+    processed = 0
+    for doc in documents:
+        if not doc.get("id"):
+            continue
+        for view in views:
+            try:
+                view.apply(doc, store)
+            except Exception as e:
+                logger.error("View %s failed for %s: %s", view.name, doc.get("id"), e)
+                raise
+        processed += 1
+    return processed
+
+class LocalChangeFeed:
+    """
+    Local stand-in for the Cosmos change feed: replays records from a file in
+    batches and checkpoints progress in a lease file, like the trigger's leases.
+    """
+
+    def __init__(self, records: List[dict], lease_path: str, batch_size: int = 100):
+        self.records = records
+        self.lease_path = lease_path
+        self.batch_size = batch_size
+
+    def _read_lease(self) -> int:
+        if not os.path.exists(self.lease_path):
+            return 0
+        with open(self.lease_path) as f:
+            return json.load(f).get("continuation", 0)
+
+    def _write_lease(self, position: int):
+        with open(self.lease_path, "w") as f:
+            json.dump({"continuation": position, "updatedAt": dt.datetime.utcnow().isoformat()}, f)
+
+    def run(self, store, views: List[DerivedView] | None = None) -> int:
+        position = self._read_lease()
+        processed = 0
+        while position < len(self.records):
+            batch = self.records[position:position + self.batch_size]
+            processed += process_changes(batch, store, views)
+            position += len(batch)
+            self._write_lease(position)
+        return processed
+
+def load_records(path: str) -> List[dict]:
+    """Load concatenated JSON objects (the format of example_records.txt) or a JSON list"""
+    with open(path) as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    records, pos = [], 0
+    while pos < len(text):
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            break
+        obj, pos = decoder.raw_decode(text, pos)
+        records.extend(obj if isinstance(obj, list) else [obj])
+    return records
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else "example_records.txt"
+    feed = LocalChangeFeed(load_records(source), lease_path=source + ".lease")
+    local_store = InMemoryViewStore(path=source + ".views.json")
+    count = feed.run(local_store)
+    print(f"Processed {count} documents")
+    print(json.dumps(local_store.docs, indent=2))
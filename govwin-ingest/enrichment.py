@@ -0,0 +1,192 @@
+"""
+Sub-resource enrichment for GovWin opportunities.
+
+Every opportunity links to sub-resources (contracts, contacts, milestones, ...).
+Each one is a registered Enricher with its own enable flag and TTL cache.
+Enabled enrichers for an opportunity run concurrently on a shared, bounded
+thread pool and page through the full sub-resource list.
+
+Environment overrides (NAME is the enricher name upper-cased, e.g. CONTACTS):
+    ENRICH_<NAME>=1|0        enable / disable an enricher
+    ENRICH_<NAME>_TTL=secs   cache lifetime for that enricher
+    ENRICH_WORKERS=n         size of the shared worker pool
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import requests
+
+logger = logging.getLogger("enrichment")
+
+API_BASE = "https://services.govwin.com/neo-ws"
+PAGE_SIZE = 100
+
+# ─── TTL cache ────────────────────────────────────────────────────────────────
+CACHE_MAX_ENTRIES = 5000  # per enricher; a warm host holds at most this many opportunities
+
+class TTLCache:
+    """
+    Thread-safe dict with per-entry expiry and a size bound. Every entry
+    shares one TTL, so insertion order is expiry order: ``set`` drops expired
+    entries from the old end, then the oldest ones beyond *max_entries*.
+    """
+
+    def __init__(self, ttl: int, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value):
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (now + self.ttl, value)
+            while self._data:
+                oldest_expires, _ = next(iter(self._data.values()))
+                if oldest_expires >= now and len(self._data) <= self.max_entries:
+                    break
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# ─── Enricher registry ────────────────────────────────────────────────────────
+@dataclass
+class Enricher:
+    name: str                       # sub-resource path segment / links key
+    response_key: str               # list key in the sub-resource payload
+    default_enabled: bool = False
+    default_ttl: int = 3600
+    opp_types: tuple = ()           # restrict to these opportunity types (empty = all)
+    condition: Callable[[dict], bool] | None = None   # extra per-opportunity guard
+    cache: TTLCache = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.cache = TTLCache(self.ttl)
+
+    @property
+    def env_prefix(self) -> str:
+        return f"ENRICH_{self.name.upper()}"
+
+    @property
+    def enabled(self) -> bool:
+        flag = os.getenv(self.env_prefix)
+        if flag is None:
+            return self.default_enabled
+        return flag.strip().lower() in ("1", "true", "yes", "on")
+
+    @property
+    def ttl(self) -> int:
+        return int(os.getenv(f"{self.env_prefix}_TTL", self.default_ttl))
+
+    def applies_to(self, opp: dict) -> bool:
+        if self.opp_types and opp.get("type", "").lower() not in self.opp_types:
+            return False
+        return self.condition is None or self.condition(opp)
+
+ENRICHERS: Dict[str, Enricher] = {}
+
+def register_enricher(enricher: Enricher) -> Enricher:
+    ENRICHERS[enricher.name] = enricher
+    return enricher
+
+def _missing_value(opp: dict) -> bool:
+    return (opp.get("oppValue") or opp.get("value")) is None
+
+# Contracts only back-fill the value of FBO notices that have none, as before
+# the enrichment stage existed; fetching them for everything multiplies API calls
+register_enricher(Enricher(
+    "contracts", "Contracts", default_enabled=True, opp_types=("fbo",), condition=_missing_value,
+))
+register_enricher(Enricher("contacts", "contacts"))
+register_enricher(Enricher("placesOfPerformance", "placesOfPerformance"))
+register_enricher(Enricher("milestones", "milestones"))
+register_enricher(Enricher("companies", "companies"))
+register_enricher(Enricher("relatedDocuments", "relatedDocuments"))
+
+# ─── Fetching ─────────────────────────────────────────────────────────────────
+_local = threading.local()
+
+def _session() -> requests.Session:
+    """One pooled HTTP session per worker thread"""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def _extract_list(payload: dict, key: str) -> list:
+    """Pull the item list out of a sub-resource payload, tolerating key casing"""
+    for candidate in (key, key[:1].upper() + key[1:], key.lower()):
+        if isinstance(payload.get(candidate), list):
+            return payload[candidate]
+    return []
+
+def _sub_resource_url(opp: dict, name: str) -> str:
+    href = (opp.get("links") or {}).get(name, {}).get("href")
+    return href or f"{API_BASE}/opportunities/{opp['id']}/{name}"
+
+def fetch_all_pages(url: str, headers: dict, response_key: str) -> list:
+    """Page through a sub-resource until a short page comes back"""
+    items, offset = [], 0
+    while True:
+        resp = _session().get(
+            url, headers=headers, params={"max": PAGE_SIZE, "offset": offset}, timeout=30
+        )
+        resp.raise_for_status()
+        page = _extract_list(resp.json(), response_key)
+        items.extend(page)
+        if len(page) < PAGE_SIZE:
+            return items
+        offset += len(page)
+
+def _run_enricher(enricher: Enricher, opp: dict, headers: dict):
+    cached = enricher.cache.get(opp["id"])
+    if cached is not None:
+        return cached
+    items = fetch_all_pages(_sub_resource_url(opp, enricher.name), headers, enricher.response_key)
+    enricher.cache.set(opp["id"], items)
+    return items
+
+def enrichment_pool() -> ThreadPoolExecutor:
+    """Bounded pool shared by every opportunity in a run"""
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("ENRICH_WORKERS", "8")),
+        thread_name_prefix="enrich",
+    )
+
+def enrich_opportunity(opp: dict, headers: dict, pool: ThreadPoolExecutor) -> Dict[str, List]:
+    """
+    Fetch every enabled sub-resource for *opp* concurrently.
+    Returns {enricher name: items}; failed enrichers are logged and omitted.
+    """
+    futures = {
+        name: pool.submit(_run_enricher, enricher, opp, headers)
+        for name, enricher in ENRICHERS.items()
+        if enricher.enabled and enricher.applies_to(opp)
+    }
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # ValueError covers undecodable JSON; one bad payload must not abort the shard
+            logger.warning("   ⚠️  %s enrichment failed for %s: %s", name, opp.get("id"), e)
+    return results
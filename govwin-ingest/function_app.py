@@ -1,10 +1,17 @@
 import os
+import json
 import logging
 import datetime as dt
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 import azure.functions as func
-from azure.cosmos import CosmosClient
+from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from derived_views import OPPORTUNITIES_CONTAINER, cosmos_view_store, process_changes
+from enrichment import enrich_opportunity, enrichment_pool
 
 app = func.FunctionApp()
 
@@ -26,13 +33,22 @@ def _get_token() -> str:
     resp.raise_for_status()
     return resp.json()["access_token"]
 
-def _cosmos_container():
+def _cosmos_database():
     client = CosmosClient(
         url=os.getenv("COSMOS_URL"),
         credential=os.getenv("COSMOS_KEY"),
         consistency_level="Session",
     )
-    return client.get_database_client("govwin").get_container_client("opportunities_optimized")
+    return client.get_database_client("govwin")
+
+def _cosmos_container():
+    return _cosmos_database().get_container_client("opportunities_optimized")
+
+def _state_container():
+    """Small container holding per-shard watermarks and run bookkeeping"""
+    return _cosmos_database().create_container_if_not_exists(
+        id="ingest_state", partition_key=PartitionKey(path="/id")
+    )
 
 def _extract_psc_code(classification_desc: str) -> str:
     """
@@ -61,126 +77,284 @@ def _extract_psc_code(classification_desc: str) -> str:
     
     return None
 
+# ─── Sortable fields ──────────────────────────────────────────────────────────
+# The dashboard sorts server-side (ORDER BY), where Cosmos orders by type
+# before value, so every document must carry the same types and formats.
+def _normalize_number(value) -> float | None:
+    """Numeric contract value; GovWin occasionally sends formatted strings"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+def _normalize_date(value) -> str | None:
+    """Fixed-width naive-UTC ISO timestamp, so string order is chronological"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+
+# ─── Shards ───────────────────────────────────────────────────────────────────
+SOURCE_MAPPING = {
+    "fbo": "SAM.gov",
+    "tns": "GSA eBuy/Task Orders", 
+    "opp": "GovWin Tracked",
+    "trackedopp": "GovWin Tracked",  # ← Fixed: Handle both variants
+    "bid": "State/Local Bids",
+    "top": "Opportunity Manager"
+}
+
+@dataclass(frozen=True)
+class Shard:
+    """One independent unit of ingest work: a search term in one market for one opp type"""
+    term: str
+    market: str
+    opp_type: str
+
+    @property
+    def key(self) -> str:
+        return f"watermark:{self.market}:{self.opp_type}:{self.term}".replace("/", "-")
+
+def _market_types() -> dict[str, list[str]]:
+    """
+    Parse INGEST_MARKETS, e.g. "Federal=FBO,TNS,OPP;State/Local=BID".
+    Defaults to the original Federal FBO/TNS/OPP coverage.
+    """
+    raw = os.getenv("INGEST_MARKETS", "Federal=FBO,TNS,OPP")
+    markets = {}
+    for part in raw.split(";"):
+        if "=" not in part:
+            continue
+        market, types = part.split("=", 1)
+        markets[market.strip()] = [t.strip().upper() for t in types.split(",") if t.strip()]
+    return markets
+
+def build_shards(search_terms: list[str]) -> list[Shard]:
+    return [
+        Shard(term, market, opp_type)
+        for market, types in _market_types().items()
+        for opp_type in types
+        for term in search_terms
+    ]
+
+# ─── Watermarks ───────────────────────────────────────────────────────────────
+def _read_watermark(state, shard: Shard) -> str | None:
+    try:
+        return state.read_item(item=shard.key, partition_key=shard.key).get("dateFrom")
+    except CosmosResourceNotFoundError:
+        return None
+
+RUN_COMPLETE_ID = "run:latest"  # polled by the dashboard prewarmer
+
+def _write_run_complete(state, started_at: str, shards: int, failed_shards: int, upserts: int):
+    """Signal that an ingest run finished, so dashboards can refresh their caches"""
+    state.upsert_item({
+        "id": RUN_COMPLETE_ID,
+        "startedAt": started_at,
+        "completedAt": dt.datetime.utcnow().isoformat(),
+        "shards": shards,
+        "failedShards": failed_shards,
+        "upserts": upserts,
+    })
+
+def _write_watermark(state, shard: Shard, date_from: str, upserts: int):
+    state.upsert_item({
+        "id": shard.key,
+        "term": shard.term,
+        "market": shard.market,
+        "oppType": shard.opp_type,
+        "dateFrom": date_from,
+        "lastUpserts": upserts,
+        "updatedAt": dt.datetime.utcnow().isoformat(),
+    })
+
+# ─── Per-opportunity preparation ──────────────────────────────────────────────
+def _prepare_opportunity(opp: dict, term: str, headers: dict, pool, logger) -> bool:
+    """Enrich and normalize one GovWin record in place; returns True if a PSC code was extracted"""
+    opp_id   = opp["id"]
+    opp_type = opp.get("type", "").lower()
+
+    # 1️⃣ Try the simple top-level value first
+    total_value = opp.get("oppValue") or opp.get("value")
+
+    # 2️⃣ Fetch enabled sub-resources (contracts, contacts, ...) concurrently
+    enrichments = enrich_opportunity(opp, headers, pool)
+    opp.update(enrichments)
+
+    # If there was no top-level value AND it's an FBO, sum its contracts
+    if total_value is None and opp_type == "fbo" and "contracts" in enrichments:
+        total_value = sum(c.get("fedPrimeObligationAmt", 0) for c in enrichments["contracts"])
+
+    # 3️⃣ If still None, leave it null in Cosmos
+    opp["contractValue"] = _normalize_number(total_value)
+
+    # 4️⃣ Create combined NAICS list (primary + additional)
+    all_naics_codes = []
+    primary_naics = opp.get("primaryNAICS")
+    if primary_naics:
+        all_naics_codes.append(primary_naics)
+    
+    additional_naics = opp.get("additionalNaics", [])
+    if additional_naics:
+        all_naics_codes.extend(additional_naics)
+        logger.info(f"   📋 Found {len(additional_naics)} additional NAICS for {opp_id}")
+    
+    opp["allNAICSCodes"] = all_naics_codes
+    # Flat id list so dashboard NAICS filters are one ARRAY_CONTAINS_ANY on an indexed path
+    opp["naicsIds"] = [n["id"] for n in all_naics_codes if isinstance(n, dict) and n.get("id")]
+
+    # 5️⃣ Extract PSC code from classificationCodeDesc (NEW!)
+    psc_extracted = False
+    classification_desc = opp.get("classificationCodeDesc")
+    if classification_desc:
+        psc_code = _extract_psc_code(classification_desc)
+        if psc_code:
+            opp["pscCode"] = psc_code
+            psc_extracted = True
+            logger.info(f"   📋 Extracted PSC code '{psc_code}' from '{classification_desc[:50]}...'")
+        else:
+            logger.warning(f"   ⚠️  Could not extract PSC from '{classification_desc[:50]}...'")
+    else:
+        opp["pscCode"] = None
+
+    # 6️⃣ Map source based on opportunity type
+    opp["source"] = SOURCE_MAPPING.get(opp_type, "Unknown")
+
+    # 7️⃣ Add user-requested fields with better names
+    opp["setAsides"] = opp.get("competitionTypes", [])
+    # Sortable dates: same postedDate fallback as the dashboard's process_dataframe
+    opp["postedDate"] = _normalize_date(opp.get("originalPostedDt") or opp.get("createdDate"))
+    opp["updateDate"] = _normalize_date(opp.get("updateDate"))  # None if unparseable, never a raw string
+
+    # 8️⃣ Augment with metadata for frontend
+    ingested_at = dt.datetime.utcnow()
+    opp["searchTerm"] = term
+    opp["ingestedAt"] = ingested_at.isoformat()
+    opp["ingestedAtEpoch"] = int(ingested_at.replace(tzinfo=dt.timezone.utc).timestamp())  # numeric copy for range scans
+    opp["relevant"]   = None
+    opp["pursued"]    = None
+    opp["seenBy"]    = {}
+    opp["userSaves"] = []
+    opp["archived"] = {}
+
+    # ✅ ADD THIS: Set partition date for proper partitioning
+    opp["partitionDate"] = ingested_at.strftime("%Y-%m-%d")  # e.g., "2025-07-15"
+
+    logger.info(
+        "   ⬆️ Upserting opp id=%s (type=%s, source=%s, contractValue=%s, naicsCount=%d, pscCode=%s)",
+        opp_id, opp_type, opp.get("source"), opp["contractValue"], len(all_naics_codes), opp.get("pscCode", "None")
+    )
+    return psc_extracted
+
+def _ingest_shard(shard: Shard, headers: dict, container, state, pool, run_date: str) -> tuple[int, int]:
+    """Page through one shard from its watermark; returns (upserts, psc extractions)"""
+    logger = logging.getLogger("pull_daily")
+    # by default get last LOOKBACK_DAYS; afterwards resume from the shard's watermark
+    date_from = _read_watermark(state, shard) or (
+        dt.datetime.utcnow() - dt.timedelta(days=LOOKBACK_DAYS)
+    ).strftime("%Y-%m-%d")
+
+    params = {
+        "q":                   shard.term,
+        "oppSelectionDateFrom": date_from,              
+        "market":              shard.market,               
+        "oppType":             shard.opp_type,   
+        "max":                 100,
+        "offset":              0,
+    }
+    url = "https://services.govwin.com/neo-ws/opportunities"
+    upserts = 0
+    psc_extractions = 0
+    while True:
+        logger.info("🔎 Fetching GOVWIN for term %r (%s %s) from %s…", shard.term, shard.market, shard.opp_type, date_from)
+        resp = requests.get(url, headers=headers, params=params, timeout=30)
+        resp.raise_for_status()
+        data = resp.json().get("opportunities", [])
+        logger.info("   → GOVWIN returned %d opportunities", len(data))
+        if not data:
+            break
+        for opp in data:
+            if _prepare_opportunity(opp, shard.term, headers, pool, logger):
+                psc_extractions += 1
+            container.upsert_item(opp)
+            upserts += 1
+        params["offset"] += len(data)
+
+    # Only advance the watermark once the whole shard has been paged through
+    _write_watermark(state, shard, run_date, upserts)
+    return upserts, psc_extractions
+
 @app.schedule(schedule="0 0 6 * * *", arg_name="timer", run_on_startup=True, use_monitor=True)
 def pull_daily(timer: func.TimerRequest):
     logger = logging.getLogger("pull_daily")
-    logger.info("🚀 Starting ingest at %s", dt.datetime.utcnow().isoformat())
+    started_at = dt.datetime.utcnow().isoformat()
+    logger.info("🚀 Starting ingest at %s", started_at)
 
     token = _get_token()
     headers = {"Authorization": f"Bearer {token}"}
-    # by default get last 1 day; override via local.settings if needed
-    date_from = (dt.datetime.utcnow() - dt.timedelta(days=LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+    run_date = dt.datetime.utcnow().strftime("%Y-%m-%d")
     search_terms = [s.strip() for s in os.getenv("SEARCH_TERMS", "").split(",") if s.strip()]
+    shards = build_shards(search_terms)
 
     container = _cosmos_container()
+    state = _state_container()
+    pool = enrichment_pool()
     total_upserts = 0
     psc_extractions = 0  # Count successful PSC extractions
-    
-    for term in search_terms:
-        params = {
-            "q":                   term,
-            "oppSelectionDateFrom": date_from,              
-            "market":              "Federal",               
-            "oppType":             "FBO,TNS,OPP",   
-            "max":                 100,
-            "offset":              0,
+    failed_shards = 0
+
+    with ThreadPoolExecutor(
+        max_workers=int(os.getenv("INGEST_SHARD_WORKERS", "4")),
+        thread_name_prefix="shard",
+    ) as shard_pool:
+        futures = {
+            shard_pool.submit(_ingest_shard, shard, headers, container, state, pool, run_date): shard
+            for shard in shards
         }
-        url = "https://services.govwin.com/neo-ws/opportunities"
-        while True:
-            logger.info("🔎 Fetching GOVWIN for term %r…", term)
-            resp = requests.get(url, headers=headers, params=params, timeout=30)
-            resp.raise_for_status()
-            data = resp.json().get("opportunities", [])
-            logger.info("   → GOVWIN returned %d opportunities", len(data))
-            if not data:
-                break
-            for opp in data:
-                opp_id   = opp["id"]
-                opp_type = opp.get("type", "").lower()
-
-                # 1️⃣ Try the simple top-level value first
-                total_value = opp.get("oppValue") or opp.get("value")
-
-                # 2️⃣ If there was no top-level value AND it's an FBO, fetch contracts
-                if total_value is None and opp_type == "fbo":
-                    contracts_url = f"https://services.govwin.com/neo-ws/opportunities/{opp_id}/contracts"
-                    contracts_resp = requests.get(  # ← Fixed: Use different variable name
-                        contracts_url,
-                        headers=headers,
-                        params={"max": 100, "offset": 0},
-                        timeout=30,
-                    )
-                    contracts_resp.raise_for_status()
-                    contracts_list = contracts_resp.json().get("Contracts", [])
-                    total_value = sum(c.get("fedPrimeObligationAmt", 0) for c in contracts_list)
-
-                # 3️⃣ If still None, leave it null in Cosmos
-                opp["contractValue"] = total_value
-
-                # 4️⃣ Create combined NAICS list (primary + additional)
-                all_naics_codes = []
-                primary_naics = opp.get("primaryNAICS")
-                if primary_naics:
-                    all_naics_codes.append(primary_naics)
-                
-                additional_naics = opp.get("additionalNaics", [])
-                if additional_naics:
-                    all_naics_codes.extend(additional_naics)
-                    logger.info(f"   📋 Found {len(additional_naics)} additional NAICS for {opp_id}")
-                
-                opp["allNAICSCodes"] = all_naics_codes
-
-                # 5️⃣ Extract PSC code from classificationCodeDesc (NEW!)
-                classification_desc = opp.get("classificationCodeDesc")
-                if classification_desc:
-                    psc_code = _extract_psc_code(classification_desc)
-                    if psc_code:
-                        opp["pscCode"] = psc_code
-                        psc_extractions += 1
-                        logger.info(f"   📋 Extracted PSC code '{psc_code}' from '{classification_desc[:50]}...'")
-                    else:
-                        logger.warning(f"   ⚠️  Could not extract PSC from '{classification_desc[:50]}...'")
-                else:
-                    opp["pscCode"] = None
-
-                # 6️⃣ Map source based on opportunity type
-                source_mapping = {
-                    "fbo": "SAM.gov",
-                    "tns": "GSA eBuy/Task Orders", 
-                    "opp": "GovWin Tracked",
-                    "trackedopp": "GovWin Tracked",  # ← Fixed: Handle both variants
-                    "bid": "State/Local Bids",
-                    "top": "Opportunity Manager"
-                }
-                opp["source"] = source_mapping.get(opp_type, "Unknown")
-
-                # 7️⃣ Add user-requested fields with better names
-                opp["setAsides"] = opp.get("competitionTypes", [])
-
-                # 8️⃣ Augment with metadata for frontend
-                opp["searchTerm"] = term
-                opp["ingestedAt"] = dt.datetime.utcnow().isoformat() 
-                opp["relevant"]   = None
-                opp["pursued"]    = None
-                opp["seenBy"]    = {}
-                opp["userSaves"] = []
-                opp["archived"] = {}
-
-                # ✅ ADD THIS: Set partition date for proper partitioning
-                opp["partitionDate"] = dt.datetime.utcnow().strftime("%Y-%m-%d")  # e.g., "2025-07-15"
-
-                logger.info(
-                    "   ⬆️ Upserting opp id=%s (type=%s, source=%s, contractValue=%s, naicsCount=%d, pscCode=%s)",
-                    opp_id, opp_type, opp.get("source"), total_value, len(all_naics_codes), opp.get("pscCode", "None")
-                )
-                container.upsert_item(opp)
-                total_upserts += 1
-            params["offset"] += len(data)
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                upserts, extracted = future.result()
+            except Exception as e:
+                # A failed shard keeps its old watermark and is retried next run
+                failed_shards += 1
+                logger.error("❌ Shard %s failed: %s", shard.key, e)
+                continue
+            total_upserts += upserts
+            psc_extractions += extracted
 
+    pool.shutdown()
     logger.info(
-        "✅ Ingest complete: processed %d terms, upserted %d records, extracted %d PSC codes (started at %s)",
+        "✅ Ingest complete: processed %d terms in %d shards (%d failed), upserted %d records, extracted %d PSC codes (started at %s)",
         len(search_terms),
+        len(shards),
+        failed_shards,
         total_upserts,
         psc_extractions,
-        dt.datetime.utcnow().isoformat(),
-    )
\ No newline at end of file
+        started_at,
+    )
+    _write_run_complete(state, started_at, len(shards), failed_shards, total_upserts)
+
+@app.cosmos_db_trigger(
+    arg_name="documents",
+    database_name="govwin",
+    container_name=OPPORTUNITIES_CONTAINER,
+    connection="COSMOS_CONNECTION",
+    lease_container_name="leases",
+    create_lease_container_if_not_exists=True,
+)
+def update_derived_views(documents: func.DocumentList):
+    """Fold every opportunity write into the registered derived views"""
+    logger = logging.getLogger("update_derived_views")
+    docs = [json.loads(d.to_json()) for d in documents]
+    processed = process_changes(docs, cosmos_view_store())
+    logger.info("🧮 Updated derived views for %d changed opportunities", processed)
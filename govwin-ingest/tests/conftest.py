@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The function app modules are plain scripts in govwin-ingest/, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
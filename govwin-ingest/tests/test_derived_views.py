@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from derived_views import (
+    FILTER_OPTION_SHARDS,
+    DailyRollupView,
+    DerivedView,
+    FilterOptionsView,
+    InMemoryViewStore,
+    LocalChangeFeed,
+    process_changes,
+)
+
+VIEWS = [FilterOptionsView(), DailyRollupView()]
+
+
+def _doc(n, **fields):
+    doc = {
+        "id": f"FBO{n}", "source": "SAM.gov", "status": "Open", "procurement": "Solicitation",
+        "pscCode": "R408", "allNAICSCodes": [{"id": "541611"}], "contractValue": 100.0,
+        "partitionDate": "2025-06-04",
+    }
+    doc.update(fields)
+    return doc
+
+
+def _filter_options(store):
+    """Union of the shard documents, as data_access._filter_options_from_view reads them"""
+    merged = {}
+    for doc in store.docs.values():
+        if doc["view"] == "filter_options":
+            for field in ("naics", "psc", "status", "sources", "procurement"):
+                merged.setdefault(field, set()).update(doc.get(field, []))
+    return merged
+
+
+def test_filter_options_union_across_shards():
+    store = InMemoryViewStore()
+    docs = [_doc(n, pscCode=f"R4{n:02d}") for n in range(20)]
+    docs.append(_doc(99, source="GovWin Tracked", procurement="<p>free text</p>"))
+    process_changes(docs, store, VIEWS)
+
+    shards = [d for d in store.docs.values() if d["view"] == "filter_options"]
+    assert 1 < len(shards) <= FILTER_OPTION_SHARDS
+    options = _filter_options(store)
+    assert options["psc"] == {f"R4{n:02d}" for n in range(20)}
+    assert options["sources"] == {"SAM.gov", "GovWin Tracked"}
+    assert options["procurement"] == {"Solicitation"}
+
+
+def test_rollup_counts_an_opportunity_once_on_its_first_day():
+    store = InMemoryViewStore()
+    process_changes([_doc(1), _doc(2, contractValue=50.0)], store, VIEWS)
+    # Re-ingested the next day with a new value: moves the value, not the count
+    process_changes([_doc(1, partitionDate="2025-06-05", contractValue=300.0)], store, VIEWS)
+
+    day = store.get("daily_rollup", "2025-06-04")
+    assert day["count"] == 2
+    assert day["totalValue"] == 350.0
+    assert store.get("daily_rollup", "2025-06-05") is None
+
+
+def test_rollup_moves_totals_when_the_source_changes():
+    store = InMemoryViewStore()
+    process_changes([_doc(1)], store, VIEWS)
+    process_changes([_doc(1, source="GSA eBuy/Task Orders")], store, VIEWS)
+    assert store.get("daily_rollup", "2025-06-04")["bySource"] == {
+        "GSA eBuy/Task Orders": {"count": 1, "value": 100.0},
+    }
+
+
+def test_local_feed_resumes_from_its_lease_and_replays_idempotently(tmp_path):
+    records = [_doc(n) for n in range(5)]
+    lease = str(tmp_path / "feed.lease")
+    store = InMemoryViewStore(path=str(tmp_path / "views.json"))
+
+    assert LocalChangeFeed(records[:3], lease, batch_size=2).run(store, VIEWS) == 3
+    assert LocalChangeFeed(records, lease, batch_size=2).run(store, VIEWS) == 2
+    snapshot = json.loads(json.dumps(store.docs))
+
+    # At-least-once delivery: replaying everything changes nothing
+    (tmp_path / "feed.lease").unlink()
+    assert LocalChangeFeed(records, lease).run(store, VIEWS) == 5
+    assert store.docs == snapshot
+    assert store.get("daily_rollup", "2025-06-04")["count"] == 5
+    assert json.loads((tmp_path / "views.json").read_text()) == snapshot
+
+
+def test_derived_view_is_abstract():
+    with pytest.raises(TypeError):
+        DerivedView()
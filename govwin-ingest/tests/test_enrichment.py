@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import enrichment
+from enrichment import ENRICHERS, TTLCache, enrich_opportunity, fetch_all_pages
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(enrichment.time, "monotonic", clock)
+    return clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(ttl=60)
+    cache.set("a", [1])
+    assert cache.get("a") == [1]
+    clock.now += 61
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_sweeps_unread_expired_entries_on_set(clock):
+    cache = TTLCache(ttl=60)
+    for key in "abc":
+        cache.set(key, key)
+    clock.now += 61
+    cache.set("d", "d")
+    assert len(cache) == 1
+    assert cache.get("d") == "d"
+
+
+def test_ttl_cache_evicts_oldest_beyond_max_entries(clock):
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 3)          # rewriting refreshes its position
+    cache.set("c", 4)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (3, 4)
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def test_fetch_all_pages_stops_at_short_page(monkeypatch):
+    monkeypatch.setattr(enrichment, "PAGE_SIZE", 2)
+    offsets = []
+
+    class Session:
+        def get(self, url, headers, params, timeout):
+            offsets.append(params["offset"])
+            remaining = 5 - params["offset"]
+            return _Response({"contacts": list(range(params["offset"], params["offset"] + min(2, remaining)))})
+
+    monkeypatch.setattr(enrichment, "_session", Session)
+    assert fetch_all_pages("https://x/contacts", {}, "contacts") == [0, 1, 2, 3, 4]
+    assert offsets == [0, 2, 4]
+
+
+def test_contracts_only_apply_to_fbo_without_value():
+    contracts = ENRICHERS["contracts"]
+    assert contracts.applies_to({"type": "FBO"})
+    assert not contracts.applies_to({"type": "FBO", "oppValue": 5.0})
+    assert not contracts.applies_to({"type": "Tracked"})
+
+
+def test_enrich_opportunity_omits_failed_enrichers(monkeypatch):
+    for name in ENRICHERS:
+        monkeypatch.delenv(f"ENRICH_{name.upper()}", raising=False)
+    monkeypatch.setenv("ENRICH_CONTACTS", "1")
+
+    def run(enricher, opp, headers):
+        if enricher.name == "contacts":
+            raise requests.ConnectionError("reset")
+        return [{"id": 1}]
+
+    monkeypatch.setattr(enrichment, "_run_enricher", run)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        result = enrich_opportunity({"id": "OPP1", "type": "fbo"}, {}, pool)
+    assert result == {"contracts": [{"id": 1}]}
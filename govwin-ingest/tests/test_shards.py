@@ -0,0 +1,108 @@
+import pytest
+import requests
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+import function_app
+from function_app import Shard, _ingest_shard, _market_types, _read_watermark, build_shards
+
+
+class StateContainer:
+    """ingest_state stand-in: point reads and upserts keyed by id"""
+
+    def __init__(self, *docs):
+        self.docs = {doc["id"]: doc for doc in docs}
+
+    def read_item(self, item, partition_key):
+        if item not in self.docs:
+            raise CosmosResourceNotFoundError(message=item)
+        return self.docs[item]
+
+    def upsert_item(self, body):
+        self.docs[body["id"]] = body
+
+
+class OppsContainer:
+    def __init__(self):
+        self.ids = []
+
+    def upsert_item(self, body):
+        self.ids.append(body["id"])
+
+
+def test_market_types_default_to_federal(monkeypatch):
+    monkeypatch.delenv("INGEST_MARKETS", raising=False)
+    assert _market_types() == {"Federal": ["FBO", "TNS", "OPP"]}
+
+
+def test_market_types_parse_and_skip_malformed_parts(monkeypatch):
+    monkeypatch.setenv("INGEST_MARKETS", " Federal = fbo, tns ;junk; State/Local=BID,")
+    assert _market_types() == {"Federal": ["FBO", "TNS"], "State/Local": ["BID"]}
+
+
+def test_build_shards_crosses_markets_types_and_terms(monkeypatch):
+    monkeypatch.setenv("INGEST_MARKETS", "Federal=FBO,OPP;State/Local=BID")
+    shards = build_shards(["cloud", "audit"])
+    assert len(shards) == 6 == len(set(shards))
+    assert Shard("audit", "State/Local", "BID") in shards
+
+
+def test_shard_key_is_a_valid_cosmos_id():
+    assert Shard("cloud", "State/Local", "BID").key == "watermark:State-Local:BID:cloud"
+
+
+def test_missing_watermark_reads_as_none():
+    assert _read_watermark(StateContainer(), Shard("cloud", "Federal", "FBO")) is None
+
+
+class _Response:
+    def __init__(self, opps):
+        self.opps = opps
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"opportunities": self.opps}
+
+
+@pytest.fixture
+def govwin(monkeypatch):
+    """Serve *pages* of GovWin results in order; an exception in the list is raised instead"""
+    calls = []
+
+    def serve(pages):
+        def get(url, headers, params, timeout):
+            calls.append(dict(params))
+            page = pages[len(calls) - 1]
+            if isinstance(page, Exception):
+                raise page
+            return _Response(page)
+        monkeypatch.setattr(function_app.requests, "get", get)
+        return calls
+
+    monkeypatch.setattr(function_app, "_prepare_opportunity", lambda opp, *args: True)
+    return serve
+
+
+def test_shard_resumes_from_its_watermark_and_advances_it(govwin):
+    shard = Shard("cloud", "Federal", "FBO")
+    state = StateContainer({"id": shard.key, "dateFrom": "2025-06-01"})
+    opps = OppsContainer()
+    calls = govwin([[{"id": "A"}, {"id": "B"}], [{"id": "C"}], []])
+
+    assert _ingest_shard(shard, {}, opps, state, None, "2025-06-04") == (3, 3)
+    assert {c["oppSelectionDateFrom"] for c in calls} == {"2025-06-01"}
+    assert [c["offset"] for c in calls] == [0, 2, 3]
+    assert opps.ids == ["A", "B", "C"]
+    assert state.docs[shard.key]["dateFrom"] == "2025-06-04"
+    assert state.docs[shard.key]["lastUpserts"] == 3
+
+
+def test_failed_shard_keeps_its_old_watermark(govwin):
+    shard = Shard("cloud", "Federal", "TNS")
+    state = StateContainer({"id": shard.key, "dateFrom": "2025-06-01"})
+    govwin([[{"id": "A"}], requests.HTTPError("503")])
+
+    with pytest.raises(requests.HTTPError):
+        _ingest_shard(shard, {}, OppsContainer(), state, None, "2025-06-04")
+    assert state.docs[shard.key]["dateFrom"] == "2025-06-01"
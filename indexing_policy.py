@@ -0,0 +1,523 @@
+"""
+Indexing policy management for the GovWin opportunity containers.
+
+Replaces the default index-everything policy with a managed one:
+- excludes the large free-text / hyperlink subtrees nobody filters on
+  (description, links, smart tags) so writes stop paying index RU for them
+- adds composite indexes for the equality + range filters and sort orders
+  produced by streamlit/data_access.build_query
+- ranges on the numeric ``ingestedAtEpoch`` copy of ``ingestedAt``
+- NAICS filters run against the flat ``naicsIds`` array instead of the
+  nested ``allNAICSCodes`` objects, which are no longer indexed
+- (sort field, id) composites serve the dashboard's server-side ORDER BY and
+  keyset paging; until ``apply`` has run, sorted dashboard queries fall back
+  to a slow local sort
+- ``backfill`` normalizes contractValue / postedDate / updateDate on older
+  documents so they sort like freshly ingested ones
+
+Usage:
+    python indexing_policy.py show
+    python indexing_policy.py benchmark --label before
+    python indexing_policy.py backfill
+    python indexing_policy.py apply
+    python indexing_policy.py verify
+    python indexing_policy.py benchmark --label after
+    python indexing_policy.py compare before after
+    python indexing_policy.py explain --naics 541611 --naics 541330 --psc R408
+    python indexing_policy.py explain --sort contractValue --top 100
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+import datetime as dt
+from collections.abc import Mapping
+
+from azure.cosmos import CosmosClient, PartitionKey
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+# Make build_query importable so the benchmark runs the same SQL the dashboard does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit"))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DATABASE = "govwin"
+# The dashboard reads "opportunities"; ingest writes "opportunities_optimized".
+# Both need the policy and the backfilled ingestedAtEpoch / naicsIds fields, or
+# the dashboard's range and ARRAY_CONTAINS_ANY predicates skip their documents.
+DEFAULT_CONTAINERS = ["opportunities", "opportunities_optimized"]
+
+# ─── Versioned policy definition ──────────────────────────────────────────────
+# Bump POLICY_VERSION whenever INDEXING_POLICY changes so the verify output
+# and benchmark files can be tied back to a definition.
+POLICY_VERSION = 5
+
+# Equality-filter fields used by build_query, each paired with the date range
+_EQUALITY_FIELDS = ["source", "status", "procurement", "pscCode"]
+
+# Sort paths offered in the dashboard sidebar (data_access.SORT_PATHS).
+# build_order_by breaks ties on id in the same direction, so one ascending
+# (field, id) composite per path serves both directions.
+_SORT_FIELDS = ["ingestedAtEpoch", "postedDate", "contractValue", "updateDate"]
+
+INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [
+        {"path": "/*"},
+    ],
+    "excludedPaths": [
+        {"path": "/description/?"},
+        {"path": "/links/*"},
+        {"path": "/smartTag/?"},
+        {"path": "/smartTagObject/*"},
+        {"path": "/primaryNAICS/sizeStandard/?"},
+        {"path": "/allNAICSCodes/*"},
+        {"path": "/additionalNaics/*"},
+        # Sub-resources attached by the ingest enrichment stage
+        {"path": "/contracts/*"},
+        {"path": "/contacts/*"},
+        {"path": "/placesOfPerformance/*"},
+        {"path": "/milestones/*"},
+        {"path": "/companies/*"},
+        {"path": "/relatedDocuments/*"},
+        {"path": "/\"_etag\"/?"},
+    ],
+    "compositeIndexes": (
+        [
+            [
+                {"path": f"/{field}", "order": "ascending"},
+                {"path": "/ingestedAtEpoch", "order": "descending"},
+            ]
+            for field in _EQUALITY_FIELDS
+        ]
+        + [
+            [
+                {"path": f"/{field}", "order": "ascending"},
+                {"path": "/id", "order": "ascending"},
+            ]
+            for field in _SORT_FIELDS
+        ]
+    ),
+}
+
+def epoch_seconds(value) -> int | None:
+    """Convert an ISO ``ingestedAt`` string (naive UTC or Z-suffixed) to epoch seconds"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return int(parsed.timestamp())
+
+# Same normalization as govwin-ingest/function_app.py, for the backfill
+def normalize_number(value) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+def normalize_date(value) -> str | None:
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+
+# ─── Cosmos helpers ───────────────────────────────────────────────────────────
+def get_cosmos_client():
+    """Get Cosmos DB client using environment variables"""
+    url = os.getenv("COSMOS_URL")
+    key = os.getenv("COSMOS_KEY")
+
+    if not url or not key:
+        raise ValueError("Please set COSMOS_URL and COSMOS_KEY environment variables")
+
+    return CosmosClient(url, key)
+
+class RequestCharge:
+    """
+    response_hook that sums x-ms-request-charge over every backend request of
+    the operations it is passed to. A cross-partition query fans out to
+    several requests per page, so the client's last_response_headers would
+    only show the last of them (same accounting as diagnostics._Call.hook).
+    """
+
+    def __init__(self):
+        self.ru = 0.0
+        self.requests = 0
+
+    def __call__(self, headers: Mapping, result):
+        # query_items also calls the hook once up front with the client's
+        # shared (stale) headers and the lazy pager as result - skip that one
+        if not isinstance(result, Mapping):
+            return
+        self.ru += float(headers.get("x-ms-request-charge", 0) or 0)
+        self.requests += 1
+
+def _normalize_policy(policy: dict) -> dict:
+    """Reduce a policy to the parts we manage, in a comparable form"""
+    def _paths(entries):
+        return sorted(p["path"] for p in entries or [])
+
+    return {
+        "indexingMode": policy.get("indexingMode", "consistent").lower(),
+        "includedPaths": _paths(policy.get("includedPaths")),
+        "excludedPaths": [p for p in _paths(policy.get("excludedPaths")) if p != '/"_etag"/?'],
+        "compositeIndexes": sorted(
+            tuple((c["path"], c.get("order", "ascending").lower()) for c in composite)
+            for composite in policy.get("compositeIndexes", [])
+        ),
+    }
+
+# ─── Commands ─────────────────────────────────────────────────────────────────
+def apply_policy(database, container_name: str):
+    """Replace the container's indexing policy, keeping its partition key"""
+    container = database.get_container_client(container_name)
+    properties = container.read()
+    pk_paths = properties["partitionKey"]["paths"]
+
+    database.replace_container(
+        container_name,
+        partition_key=PartitionKey(path=pk_paths[0]),
+        indexing_policy=INDEXING_POLICY,
+    )
+    logger.info(f"Applied indexing policy v{POLICY_VERSION} to {container_name}")
+
+def verify_policy(database, container_name: str) -> bool:
+    """Check the live policy against the definition and report index rebuild progress"""
+    container = database.get_container_client(container_name)
+    properties = container.read(populate_quota_info=True)
+    progress = container.client_connection.last_response_headers.get(
+        "x-ms-documentdb-collection-index-transformation-progress"
+    )
+
+    live = _normalize_policy(properties.get("indexingPolicy", {}))
+    wanted = _normalize_policy(INDEXING_POLICY)
+
+    ok = True
+    for key in wanted:
+        if live[key] != wanted[key]:
+            ok = False
+            missing = [v for v in wanted[key] if v not in live[key]] if isinstance(wanted[key], list) else wanted[key]
+            extra = [v for v in live[key] if v not in wanted[key]] if isinstance(live[key], list) else live[key]
+            logger.warning(f"⚠️ {container_name}.{key} differs - missing: {missing}, unexpected: {extra}")
+
+    if ok:
+        logger.info(f"✅ {container_name} matches indexing policy v{POLICY_VERSION}")
+    logger.info(f"Index transformation progress for {container_name}: {progress or 'unknown'}%")
+    return ok
+
+def backfill_epoch(database, container_name: str) -> int:
+    """Add ingestedAtEpoch to documents written before ingest started populating it"""
+    container = database.get_container_client(container_name)
+    query = (
+        "SELECT c.id, c.ingestedAt FROM c "
+        "WHERE IS_DEFINED(c.ingestedAt) AND NOT IS_DEFINED(c.ingestedAtEpoch)"
+    )
+    patched = 0
+    charge = RequestCharge()
+    for doc in container.query_items(query, enable_cross_partition_query=True, max_item_count=500, response_hook=charge):
+        epoch = epoch_seconds(doc.get("ingestedAt"))
+        if epoch is None:
+            logger.warning(f"Could not parse ingestedAt for document {doc.get('id')}")
+            continue
+        container.patch_item(
+            item=doc["id"],
+            partition_key=doc["id"],
+            patch_operations=[{"op": "add", "path": "/ingestedAtEpoch", "value": epoch}],
+            response_hook=charge,
+        )
+        patched += 1
+        if patched % 500 == 0:
+            logger.info(f"Backfilled {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+
+    logger.info(f"Backfilled {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+    return patched
+
+def backfill_naics_ids(database, container_name: str) -> int:
+    """Add the flat naicsIds array to documents written before ingest started populating it"""
+    container = database.get_container_client(container_name)
+    query = (
+        "SELECT c.id, c.allNAICSCodes FROM c "
+        "WHERE IS_DEFINED(c.allNAICSCodes) AND NOT IS_DEFINED(c.naicsIds)"
+    )
+    patched = 0
+    charge = RequestCharge()
+    for doc in container.query_items(query, enable_cross_partition_query=True, max_item_count=500, response_hook=charge):
+        ids = [n["id"] for n in doc.get("allNAICSCodes") or [] if isinstance(n, dict) and n.get("id")]
+        container.patch_item(
+            item=doc["id"],
+            partition_key=doc["id"],
+            patch_operations=[{"op": "add", "path": "/naicsIds", "value": ids}],
+            response_hook=charge,
+        )
+        patched += 1
+        if patched % 500 == 0:
+            logger.info(f"Backfilled naicsIds on {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+
+    logger.info(f"Backfilled naicsIds on {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+    return patched
+
+def backfill_sort_fields(database, container_name: str) -> int:
+    """Normalize contractValue, postedDate and updateDate on documents ingested before ingest did"""
+    container = database.get_container_client(container_name)
+    query = (
+        "SELECT c.id, c.contractValue, c.oppValue, c.originalPostedDt, c.createdDate, c.updateDate FROM c "
+        "WHERE NOT IS_DEFINED(c.postedDate) OR NOT IS_DEFINED(c.contractValue) "
+        "OR IS_STRING(c.contractValue) OR NOT IS_DEFINED(c.updateDate)"
+    )
+    patched = 0
+    charge = RequestCharge()
+    for doc in container.query_items(query, enable_cross_partition_query=True, max_item_count=500, response_hook=charge):
+        value = normalize_number(doc.get("contractValue"))
+        if value is None:
+            value = normalize_number(doc.get("oppValue"))
+        operations = [
+            {"op": "set", "path": "/contractValue", "value": value},
+            {"op": "set", "path": "/postedDate",
+             "value": normalize_date(doc.get("originalPostedDt") or doc.get("createdDate"))},
+        ]
+        # Unparseable updates become null rather than a string that sorts wrongly,
+        # and missing ones an explicit null so every document has the sort path
+        update_date = normalize_date(doc.get("updateDate"))
+        if "updateDate" not in doc or update_date != doc["updateDate"]:
+            operations.append({"op": "set", "path": "/updateDate", "value": update_date})
+        container.patch_item(item=doc["id"], partition_key=doc["id"], patch_operations=operations, response_hook=charge)
+        patched += 1
+        if patched % 500 == 0:
+            logger.info(f"Normalized sort fields on {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+
+    logger.info(f"Normalized sort fields on {patched} documents in {container_name} ({charge.ru:,.1f} RU)")
+    return patched
+
+def _benchmark_queries() -> dict:
+    """Representative dashboard queries, built with the dashboard's own query builder"""
+    from data_access import build_query
+
+    end = dt.datetime.utcnow()
+    empty = {"src": [], "naics": [], "psc": [], "status": [], "procurement": []}
+    return {
+        "24h_unfiltered": build_query(end - dt.timedelta(days=1), end, empty),
+        "7d_unfiltered": build_query(end - dt.timedelta(days=7), end, empty),
+        "7d_source": build_query(end - dt.timedelta(days=7), end, {**empty, "src": ["SAM.gov"]}),
+        "7d_status": build_query(end - dt.timedelta(days=7), end, {**empty, "status": ["Post-RFP"]}),
+        "30d_psc": build_query(end - dt.timedelta(days=30), end, {**empty, "psc": ["R406", "R408"]}),
+        "30d_naics": build_query(end - dt.timedelta(days=30), end, {**empty, "naics": ["541611", "541330", "541512"]}),
+        "30d_top_value": build_query(end - dt.timedelta(days=30), end, empty, sort_by="contractValue", top=100),
+        "30d_latest_update": build_query(end - dt.timedelta(days=30), end, empty, sort_by="updateDate", top=100),
+    }
+
+def _run_query(container, query: str, params: list) -> dict:
+    """Drain a query, returning its total RU (every backend request), item count and wall time"""
+    charge = RequestCharge()
+    items = 0
+    started = time.perf_counter()
+    pager = container.query_items(
+        query, parameters=params, enable_cross_partition_query=True, response_hook=charge
+    ).by_page()
+    for page in pager:
+        items += len(list(page))
+    return {
+        "ru": round(charge.ru, 2),
+        "requests": charge.requests,
+        "items": items,
+        "ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+def _scratch_write_charges(database, container, samples: int) -> list:
+    """
+    Index-write cost of rewriting sample documents, measured in a throwaway
+    copy of the container with the same live policy. Upserting in place would
+    bump _ts, so the dashboard's delta refresh and change feed would
+    re-deliver the samples as changed.
+    """
+    properties = container.read()
+    scratch_name = f"{properties['id']}_benchmark_scratch"
+    scratch = database.create_container(
+        scratch_name,
+        partition_key=PartitionKey(path=properties["partitionKey"]["paths"][0]),
+        indexing_policy=properties.get("indexingPolicy"),
+    )
+    try:
+        charges = []
+        for doc in container.query_items(
+            f"SELECT TOP {int(samples)} * FROM c", enable_cross_partition_query=True
+        ):
+            body = {k: v for k, v in doc.items() if not k.startswith("_")}
+            scratch.create_item(body)
+            # The second write replaces an indexed document, like a re-ingest does
+            charge = RequestCharge()
+            scratch.upsert_item(body, response_hook=charge)
+            charges.append(charge.ru)
+        return charges
+    finally:
+        database.delete_container(scratch_name)
+
+def benchmark(database, container_name: str, label: str, samples: int) -> dict:
+    """Measure RU and latency for representative queries and document rewrites"""
+    container = database.get_container_client(container_name)
+    results = {
+        "label": label,
+        "container": container_name,
+        "policyVersion": POLICY_VERSION,
+        "takenAt": dt.datetime.utcnow().isoformat(),
+        "queries": {},
+        "writes": {},
+    }
+
+    for name, (query, params) in _benchmark_queries().items():
+        results["queries"][name] = stats = _run_query(container, query, params)
+        logger.info(f"{name}: {stats['ru']:,.2f} RU over {stats['requests']} requests, {stats['items']} items")
+
+    write_charges = _scratch_write_charges(database, container, samples)
+    if write_charges:
+        results["writes"] = {
+            "samples": len(write_charges),
+            "avgRu": round(sum(write_charges) / len(write_charges), 2),
+            "maxRu": round(max(write_charges), 2),
+        }
+        logger.info(f"upsert: {results['writes']['avgRu']:,.2f} RU avg over {len(write_charges)} docs")
+
+    path = f"indexing_benchmark_{container_name}_{label}.json"
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Saved benchmark to {path}")
+    return results
+
+def compare(container_name: str, before_label: str, after_label: str):
+    """Print the RU difference between two saved benchmark runs"""
+    with open(f"indexing_benchmark_{container_name}_{before_label}.json") as f:
+        before = json.load(f)
+    with open(f"indexing_benchmark_{container_name}_{after_label}.json") as f:
+        after = json.load(f)
+
+    def _row(name, old, new):
+        delta = new - old
+        pct = (delta / old * 100) if old else 0.0
+        print(f"{name:<20} {old:>10.2f} {new:>10.2f} {delta:>+10.2f} {pct:>+8.1f}%")
+
+    print(f"\n{container_name}: {before_label} (v{before['policyVersion']}) → {after_label} (v{after['policyVersion']})")
+    print(f"{'operation':<20} {'before RU':>10} {'after RU':>10} {'delta':>10} {'change':>9}")
+    print("-" * 63)
+    for name, old in before["queries"].items():
+        new = after["queries"].get(name)
+        if new:
+            _row(name, old["ru"], new["ru"])
+    if before.get("writes") and after.get("writes"):
+        _row("upsert (avg)", before["writes"]["avgRu"], after["writes"]["avgRu"])
+
+def _legacy_query(query: str) -> str:
+    """The same query with NAICS as one EXISTS subquery per code over allNAICSCodes,
+    and IN lists as OR chains - the form build_query emitted before naicsIds"""
+    def _naics(match):
+        names = [n.strip() for n in match.group(1).split(",")]
+        return "(" + " OR ".join(
+            f"EXISTS(SELECT VALUE n FROM n IN c.allNAICSCodes WHERE n.id = {name})" for name in names
+        ) + ")"
+
+    def _in(match):
+        field, names = match.group(1), [n.strip() for n in match.group(2).split(",")]
+        return "(" + " OR ".join(f"{field} = {name}" for name in names) + ")"
+
+    query = re.sub(r"ARRAY_CONTAINS_ANY\(c\.naicsIds, ([^)]*)\)", _naics, query)
+    return re.sub(r"(c\.\w+) IN \(([^)]*)\)", _in, query)
+
+def explain(database, container_name: str, days: int, flt: dict, sort_by: str | None = None, top: int | None = None):
+    """Print the compiled dashboard query for *flt* and its cost next to the legacy form"""
+    from data_access import build_query
+
+    end = dt.datetime.utcnow()
+    query, params = build_query(end - dt.timedelta(days=days), end, flt, sort_by=sort_by, top=top)
+    print(f"\n{query}")
+    print(json.dumps({p["name"]: p["value"] for p in params}))
+    if database is None:
+        return
+
+    container = database.get_container_client(container_name)
+    print(f"\n{container_name}: last {days} days")
+    print(f"{'form':<10} {'RU':>10} {'requests':>9} {'items':>8} {'ms':>10}")
+    print("-" * 51)
+    for form, sql in (("legacy", _legacy_query(query)), ("compiled", query)):
+        stats = _run_query(container, sql, params)
+        print(f"{form:<10} {stats['ru']:>10.2f} {stats['requests']:>9} {stats['items']:>8} {stats['ms']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the opportunities indexing policy")
+    parser.add_argument("command", choices=["show", "apply", "verify", "backfill", "benchmark", "compare", "explain"])
+    parser.add_argument("labels", nargs="*", help="benchmark labels for compare (before after)")
+    parser.add_argument("--container", action="append", help="container name (repeatable)")
+    parser.add_argument("--label", default="current", help="label for benchmark output")
+    parser.add_argument("--samples", type=int, default=20, help="documents rewritten in a scratch container by benchmark")
+    parser.add_argument("--days", type=int, default=30, help="date window for explain")
+    parser.add_argument("--dry-run", action="store_true", help="explain: print the query without running it")
+    parser.add_argument("--sort", help="explain: server-side sort field (descending)")
+    parser.add_argument("--top", type=int, help="explain: TOP N limit")
+    for flag, key in (("--naics", "naics"), ("--psc", "psc"), ("--src", "src"),
+                      ("--status", "status"), ("--procurement", "procurement")):
+        parser.add_argument(flag, dest=key, action="append", default=[], help=f"explain: {key} filter value (repeatable)")
+    args = parser.parse_args()
+
+    containers = args.container or DEFAULT_CONTAINERS
+
+    if args.command == "show":
+        print(json.dumps({"version": POLICY_VERSION, "policy": INDEXING_POLICY}, indent=2))
+        return
+    if args.command == "compare":
+        if len(args.labels) != 2:
+            parser.error("compare needs two labels, e.g. compare before after")
+        for name in containers:
+            compare(name, *args.labels)
+        return
+
+    if args.command == "explain" and args.dry_run:
+        flt = {k: getattr(args, k) for k in ("src", "naics", "psc", "status", "procurement")}
+        explain(None, containers[0], args.days, flt, args.sort, args.top)
+        return
+
+    database = get_cosmos_client().get_database_client(DATABASE)
+    ok = True
+    for name in containers:
+        try:
+            database.get_container_client(name).read()
+        except CosmosResourceNotFoundError:
+            logger.warning(f"⚠️ Container {name} does not exist - skipping")
+            continue
+        if args.command == "apply":
+            apply_policy(database, name)
+        elif args.command == "verify":
+            ok = verify_policy(database, name) and ok
+        elif args.command == "backfill":
+            backfill_epoch(database, name)
+            backfill_naics_ids(database, name)
+            backfill_sort_fields(database, name)
+        elif args.command == "benchmark":
+            benchmark(database, name, args.label, args.samples)
+        elif args.command == "explain":
+            flt = {k: getattr(args, k) for k in ("src", "naics", "psc", "status", "procurement")}
+            explain(database, name, args.days, flt, args.sort, args.top)
+
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,39 +3,36 @@ GovWin 24-h Dashboard - Main Streamlit Application
 Displays government contracting opportunities with Parker Tide default filters.
 """
 
+import os
+import tempfile
 from datetime import datetime, timedelta
 
 import pandas as pd
 import streamlit as st
 
 # Import our modules
-from data_access import get_filter_options, merge_with_preferred, fetch_opps
-from cards import render_card, header_text
-
-# ─── Parker Tide Default Filters ─────────────────────────────────────────────
-# Complete NAICS and PSC codes relevant to Parker Tide's services
-# Based on pt_naics_psc.docx - includes consulting, technical, administrative services
-PARKER_TIDE_NAICS = [
-    "518210", "541199", "541211", "541214", "541219", "541330", "541519", 
-    "541611", "541612", "541618", "541690", "541720", "541930", "541990", 
-    "561110", "561311", "561312", "561320", "561410", "561421", "561431", 
-    "561499", "561611", "611430"
-]
-
-PARKER_TIDE_PSC = [
-    "R406", "R408", "R418", "R499", "R607", "R699", "R707"
-]
+from data_access import get_filter_options, merge_with_preferred, fetch_opps_page, fetch_first_page, search_mask, search_history, start_search_index_build, merge_pages, load_detail, stream_opps, concat_pages, fetch_opps, fetch_summary, latest_ts, merge_delta, poll_changes, apply_live_changes, LIVE_POLL_SECONDS
+from cards import render_card, header_text, flush_feedback_queue
+from export import export_opps, APP_EXPORT_MAX_ROWS, FORMATS as EXPORT_FORMATS
+from defaults import PARKER_TIDE_NAICS, PARKER_TIDE_PSC, DEFAULT_LOOKBACK_DAYS, available_defaults
+from prewarm import start_prewarmer
+from diagnostics import history_frame, summary_by_op, clear as clear_diagnostics
 
 # ─── Streamlit page config ────────────────────────────────────────────────────
 st.set_page_config("GovWin 24-h Dashboard", "🏛️", layout="wide")
 
+# Keeps filter options and the default landing view warm (once per process)
+start_prewarmer()
+# Builds the full-history search index off the request path (once per process)
+start_search_index_build()
+
 # ─── Sidebar filters ──────────────────────────────────────────────────────────
 with st.sidebar:
     st.header("🔍 Filters (New to Us)")
     st.caption("Filter by when we discovered opportunities, not when they were originally posted")
 
     now = datetime.utcnow()
-    from_dt = st.date_input("From", now.date() - timedelta(days=1), max_value=now.date())
+    from_dt = st.date_input("From", now.date() - timedelta(days=DEFAULT_LOOKBACK_DAYS), max_value=now.date())
     to_dt = st.date_input("To", now.date(), max_value=now.date())
 
     # Filter Logic Explanation
@@ -71,8 +68,7 @@ with st.sidebar:
     procurement_options = filter_options.get("procurement", [])
     
     # Filter Parker Tide defaults to only include codes that exist in the database
-    available_parker_naics = [code for code in PARKER_TIDE_NAICS if code in naics_options]
-    available_parker_psc = [code for code in PARKER_TIDE_PSC if code in psc_options]
+    available_parker_naics, available_parker_psc = available_defaults(filter_options)
     
     # Show Parker Tide coverage info
     if available_parker_naics or available_parker_psc:
@@ -127,17 +123,86 @@ with st.sidebar:
     
     sort_by = st.selectbox("Sort by", base_sort_options)
     sort_dir = st.radio("Direction", ["Descending", "Ascending"])
+    sort = (sort_by, sort_dir == "Ascending")
 
+    st.toggle("🟢 Live updates", key="live", help=f"Check for new and changed opportunities every {LIVE_POLL_SECONDS} s and add the ones matching these filters")
+    stream_all = st.toggle("⚡ Stream all results", help="Load every matching opportunity instead of one page, showing results as each page arrives")
     run = st.button("Apply", type="primary", use_container_width=True)
 
+    st.divider()
+    st.subheader("🔎 Search All History")
+    history_query = st.text_input("Keywords", help="Searches title, description, agency and tags across every ingested opportunity, ignoring the filters above")
+    history_run = st.button("Search history", use_container_width=True, disabled=not history_query)
+
+# ─── Summary metrics ──────────────────────────────────────────────────────────
+def render_metrics(count: int, total_value: float, more: bool = False):
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Opportunities", f"{count:,}" + ("+" if more else ""))
+    col2.metric("Total Value", f"${total_value:,.0f}")
+    col3.metric("Avg. Value", f"${total_value / count if count else 0:,.0f}")
+
+# ─── Streaming load ───────────────────────────────────────────────────────────
+def stream_results(query: tuple, sort: tuple):
+    """
+    Show metrics and card headers as each Cosmos page arrives, then store the
+    combined frame and rerun into the normal (interactive) results view.
+    """
+    metrics = st.empty()
+    status = st.empty()
+    preview = st.container()
+    pages, count, total_value = [], 0, 0.0
+    try:
+        for page in stream_opps(*query, sort_by=sort[0], ascending=sort[1]):
+            pages.append(page)
+            count += len(page)
+            total_value += page["contractValue"].sum()
+            with metrics.container():
+                render_metrics(count, total_value, more=True)
+            status.caption(f"⏳ Loading… {len(pages)} pages so far")
+            with preview:
+                for _, row in page.iterrows():
+                    with st.expander(header_text(row)):
+                        st.caption("Loading – details are available once every page has arrived")
+    except Exception as e:
+        # Shown after the rerun below, which would otherwise wipe it immediately
+        st.session_state.load_error = f"Error fetching opportunities after {count:,} rows: {e}"
+    st.session_state.df = concat_pages(pages)
+    st.session_state.next_token = None
+    st.session_state.summary = None
+    st.rerun()
+
 # ─── Fetch & cache ────────────────────────────────────────────────────────────
 if run or "df" not in st.session_state:
-    with st.spinner("Loading…"):        
-        st.session_state.df = fetch_opps(
-            datetime.combine(from_dt, datetime.min.time()),
-            datetime.combine(to_dt, datetime.max.time()),
-            {"src": src, "naics": naics, "psc": psc, "status": status, "procurement": procurement}
-        )
+    # Remember the query so "Load more" continues the same result set
+    st.session_state.query = (
+        datetime.combine(from_dt, datetime.min.time()),
+        datetime.combine(to_dt, datetime.max.time()),
+        {"src": src, "naics": naics, "psc": psc, "status": status, "procurement": procurement},
+    )
+    st.session_state.df_source = "query"
+    st.session_state.live_token = None
+    st.session_state.sort = sort
+    if stream_all:
+        stream_results(st.session_state.query, sort)
+    else:
+        with st.spinner("Loading…"):        
+            st.session_state.df, st.session_state.next_token, st.session_state.summary = fetch_first_page(*st.session_state.query, *sort)
+elif st.session_state.get("next_token") and st.session_state.get("sort") != sort:
+    # Pages still on the server: reload so the first page is the top of the
+    # new order (a fully loaded set is just re-sorted locally below)
+    st.session_state.sort = sort
+    with st.spinner("Sorting…"):
+        st.session_state.df, st.session_state.next_token, st.session_state.summary = fetch_first_page(*st.session_state.query, *sort)
+
+if history_run:
+    with st.spinner("Searching…"):
+        st.session_state.df = search_history(history_query, loaded=st.session_state.get("df"))
+        st.session_state.next_token = None
+        st.session_state.summary = None
+        st.session_state.df_source = "history"
+
+if "load_error" in st.session_state:
+    st.error(st.session_state.pop("load_error"))
 
 df = st.session_state.get("df", pd.DataFrame())
 
@@ -146,27 +211,164 @@ if df.empty:
     st.info("No opportunities for the chosen window / filters.")
     st.stop()
 
-# ─── Summary metrics ──────────────────────────────────────────────────────────
-col1, col2, col3 = st.columns(3)
-col1.metric("Opportunities", f"{len(df):,}")
-col2.metric("Total Value", f"${df['contractValue'].sum():,.0f}")
-col3.metric("Avg. Value", f"${df['contractValue'].mean():,.0f}")
+# ─── Summary ──────────────────────────────────────────────────────────────────
+# Exact server-side aggregates when available, otherwise totals of the loaded rows
+summary = st.session_state.get("summary")
+if summary:
+    render_metrics(summary["count"], summary["total_value"])
+else:
+    render_metrics(len(df), df["contractValue"].sum(), more=bool(st.session_state.get("next_token")))
+
+# ─── Delta refresh ────────────────────────────────────────────────────────────
+if "refresh_note" in st.session_state:
+    st.toast(st.session_state.pop("refresh_note"))
+
+if st.session_state.get("df_source") == "query" and latest_ts(df) is not None:
+    if st.button("🔄 Refresh", help="Fetch only opportunities added or changed since these results were loaded"):
+        with st.spinner("Checking for changes…"):
+            delta = fetch_opps(*st.session_state.query, since_ts=latest_ts(df))
+        st.session_state.df, added, updated = merge_delta(st.session_state.df, delta)
+        if added or updated:
+            st.session_state.summary = fetch_summary(*st.session_state.query, refresh=True)
+        st.session_state.refresh_note = f"🔄 {added} new, {updated} updated"
+        st.rerun()
+
+# ─── Live mode ────────────────────────────────────────────────────────────────
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def live_updates():
+    """Poll the change feed and fold matching changes into the loaded results"""
+    try:
+        docs, token = poll_changes(st.session_state.get("live_token"), latest_ts(st.session_state.df))
+    except Exception as e:
+        # Keep the previous token so the next poll resumes where this one failed
+        st.error(f"Live update failed, retrying in {LIVE_POLL_SECONDS}s: {e}")
+        return
+    st.session_state.live_token = token
+    df, added, updated, removed = apply_live_changes(st.session_state.df, docs, *st.session_state.query)
+    st.caption(f"🟢 Live – last checked {datetime.utcnow():%H:%M:%S} UTC")
+    if added or updated or removed:
+        st.session_state.df = df
+        st.session_state.summary = fetch_summary(*st.session_state.query, refresh=True)
+        st.session_state.refresh_note = f"🟢 {added} new, {updated} updated" + (f", {removed} no longer match" if removed else "")
+        st.rerun()
+
+if st.session_state.get("live") and st.session_state.get("df_source") == "query":
+    live_updates()
 
 st.divider()
 
-# ─── Search-within results ────────────────────────────────────────────────────
-search = st.text_input("Search within results")
-if search:
-    mask = df.apply(lambda r: search.lower() in str(r).lower(), axis=1)
-    df = df[mask]
+# ─── Export ───────────────────────────────────────────────────────────────────
+with st.expander("📤 Export results"):
+    st.caption(
+        f"Exports the opportunities matching the current filters (not just the loaded cards), written page by page, "
+        f"up to {APP_EXPORT_MAX_ROWS:,} rows. Use export.py for larger exports."
+    )
+    export_fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, format_func=str.upper)
+    # Written to a temp file only on click, read back once for this run's
+    # download button (which holds it in memory, hence the row cap) and
+    # deleted straight away; nothing is kept across reruns
+    if st.button("Prepare export", disabled="query" not in st.session_state):
+        with tempfile.NamedTemporaryFile(suffix=f".{export_fmt}", delete=False) as tmp:
+            path = tmp.name
+        progress = st.empty()
+        try:
+            rows = export_opps(*st.session_state.query, path, export_fmt,
+                               progress=lambda n: progress.caption(f"⏳ {n:,} rows written…"),
+                               sort=st.session_state.get("sort"), top=APP_EXPORT_MAX_ROWS)
+            with open(path, "rb") as f:
+                data = f.read()
+            if rows == APP_EXPORT_MAX_ROWS:
+                progress.warning(f"Export stopped at {rows:,} rows; run export.py for the full result set.")
+            else:
+                progress.empty()
+            st.download_button(
+                f"⬇️ Download {rows:,} rows ({export_fmt.upper()})", data,
+                file_name=f"govwin_opportunities_{datetime.utcnow():%Y%m%d_%H%M}.{export_fmt}",
+                mime=EXPORT_FORMATS[export_fmt],
+                on_click="ignore",
+            )
+        except Exception as e:
+            progress.error(f"Export failed: {e}")
+        finally:
+            os.remove(path)
+
+# ─── Queued feedback ──────────────────────────────────────────────────────────
+FLUSH_STATUS = {
+    "saved": "✅ Saved",
+    "conflict": "⚠️ Changed by someone else – card refreshed",
+    "missing": "❌ No longer exists",
+    "error": "❌ Failed – still queued",
+}
+
+if st.button("💾 Save all feedback", help="Write every queued Relevant?/Pursued? change at once"):
+    with st.spinner("Saving feedback…"):
+        report = flush_feedback_queue()
+    if not report:
+        st.info("No queued feedback to save.")
+    else:
+        counts = pd.Series(report).value_counts()
+        outcome = ", ".join(f"{n} {status}" for status, n in counts.items())
+        (st.success if set(report.values()) == {"saved"} else st.warning)(f"Feedback: {outcome}")
+        titles = dict(zip(df["id"], df["title"]))
+        with st.expander("Details"):
+            for opp_id, status in report.items():
+                st.markdown(f"- **{titles.get(opp_id, opp_id)}** – {FLUSH_STATUS[status]}")
+
+# ─── Results (search, sort, cards) ────────────────────────────────────────────
+@st.fragment
+def render_results(df: pd.DataFrame, sort_by: str, ascending: bool):
+    """
+    Search box, sort and card list as one fragment: typing a search or opening
+    a card reruns only this block, and each card's feedback form is its own
+    nested fragment (see cards._render_feedback_section).
+    """
+    search = st.text_input("Search within results", help='All terms must match; use "quotes" for phrases')
+    if search:
+        df = df[search_mask(df, search)]
 
-# ─── Sort ────────────────────────────────────────────────────────────────────
-ascending = sort_dir == "Ascending"
-df = df.sort_values(sort_by, ascending=ascending)
+    # History search results keep their relevance ranking. Query results
+    # arrive in server order; sorting again places delta / live rows, with
+    # missing values where Cosmos puts them (first ascending, last descending)
+    if "searchRank" not in df:
+        df = df.sort_values(sort_by, ascending=ascending, na_position="first" if ascending else "last")
 
-# ─── Main opportunity display loop with ChatGPT's approach ───────────────────
-for idx, row in df.iterrows():
-    with st.expander(header_text(row)):
-        render_card(row, idx)
+    for idx, row in df.iterrows():
+        with st.expander(header_text(row)):
+            # Details (and the copy button iframe) only load once asked for
+            if st.toggle("Show details", key=f"details_{row['id']}"):
+                render_card(load_detail(row), idx)
+
+render_results(df, sort_by, sort_dir == "Ascending")
+
+# ─── Load more ────────────────────────────────────────────────────────────────
+if st.session_state.get("next_token"):
+    if st.button("⬇️ Load more", use_container_width=True):
+        with st.spinner("Loading more…"):
+            more, st.session_state.next_token = fetch_opps_page(
+                *st.session_state.query, after=st.session_state.next_token,
+                sort_by=st.session_state.sort[0], ascending=st.session_state.sort[1],
+            )
+        st.session_state.df = merge_pages(st.session_state.df, more)
+        st.rerun()
+
+# ─── Diagnostics ──────────────────────────────────────────────────────────────
+# Drawn last so the panel includes the calls made by this run
+with st.sidebar:
+    st.divider()
+    if st.toggle("🩺 Query diagnostics", help="Cosmos request charge, latency and item counts for this session's recent calls"):
+        calls = history_frame(limit=50)
+        if calls.empty:
+            st.caption("No Cosmos calls yet – cached results cost nothing.")
+        else:
+            d1, d2 = st.columns(2)
+            d1.metric("RU (last 50)", f"{calls['ru'].sum():,.1f}")
+            d2.metric("Avg latency", f"{calls['client_ms'].mean():,.0f} ms")
+            st.dataframe(summary_by_op(), use_container_width=True)
+            st.dataframe(calls, use_container_width=True, hide_index=True)
+            if st.button("Clear diagnostics", use_container_width=True):
+                clear_diagnostics()
+                st.rerun()
 
-st.caption(f"Dashboard refreshed: {datetime.utcnow():%Y-%m-%d %H:%M UTC} | Showing opportunities by discovery date")
\ No newline at end of file
+memory = st.session_state.df.attrs.get("memory")
+memory_note = f" | Session data: {memory['after'] / 1e6:,.1f} MB (raw {memory['before'] / 1e6:,.1f} MB)" if memory else ""
+st.caption(f"Dashboard refreshed: {datetime.utcnow():%Y-%m-%d %H:%M UTC} | Showing opportunities by discovery date{memory_note}")
\ No newline at end of file
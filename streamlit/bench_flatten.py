@@ -0,0 +1,124 @@
+"""
+Benchmark: row-wise nested-field flattening vs data_access.flatten_nested.
+
+The legacy path is what fetch_opps and the card renderers used to do: three
+.apply passes at load time, then a per-row walk of allNAICSCodes,
+competitionTypes, contractTypes, setAsides and smartTagObject on every rerun.
+The pandas path builds the same flat columns with .str.get / explode /
+groupby, for comparison with flatten_nested's list comprehensions.
+
+Usage:
+    python bench_flatten.py [rows] [reruns]
+"""
+
+import os
+import sys
+import time
+import json
+import copy
+
+import pandas as pd
+
+from data_access import flatten_nested
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "govwin-ingest", "example_records.txt")
+
+def load_examples() -> list:
+    with open(EXAMPLES) as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    records, pos = [], 0
+    while pos < len(text):
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            break
+        obj, pos = decoder.raw_decode(text, pos)
+        records.append(obj)
+    return records
+
+def make_frame(rows: int) -> pd.DataFrame:
+    examples = load_examples()
+    items = []
+    for i in range(rows):
+        doc = copy.deepcopy(examples[i % len(examples)])
+        doc["id"] = f"{doc['id']}-{i}"
+        items.append(doc)
+    return pd.DataFrame(items)
+
+def legacy_load(df: pd.DataFrame) -> pd.DataFrame:
+    df["agency"] = df["govEntity"].apply(lambda g: g.get("title") if isinstance(g, dict) else None)
+    df["naicsCode"] = df["primaryNAICS"].apply(lambda n: n.get("id") if isinstance(n, dict) else None)
+    df["naicsTitle"] = df["primaryNAICS"].apply(lambda n: n.get("title") if isinstance(n, dict) else None)
+    return df
+
+def _str_joined(values: pd.Series, key: str) -> pd.Series:
+    items = values.where(values.map(type) == list).explode()
+    items = items[items.map(type) == dict]
+    joined = items.str.get(key).fillna("").astype(str).groupby(level=0).agg(", ".join)
+    return joined.reindex(values.index, fill_value="")
+
+def pandas_load(df: pd.DataFrame) -> pd.DataFrame:
+    """flatten_nested's columns via pandas .str accessors instead of list comprehensions"""
+    df["agency"] = df["govEntity"].str.get("title")
+    df["naicsCode"] = df["primaryNAICS"].str.get("id")
+    df["naicsTitle"] = df["primaryNAICS"].str.get("title")
+    df["allNaicsIds"] = _str_joined(df["allNAICSCodes"], "id")
+    df["setAsideTitles"] = _str_joined(df["setAsides"], "title")
+    df["competitionTitles"] = _str_joined(df["competitionTypes"], "title")
+    df["contractTypeTitles"] = _str_joined(df["contractTypes"], "title")
+    tags = df["smartTagObject"].where(df["smartTagObject"].map(type) == list).explode()
+    tags = tags[tags.map(type) == dict]
+    names, flags = tags.str.get("name").fillna("").astype(str), tags.str.get("isPrimary")
+    for col, flag in (("primaryTags", 1), ("secondaryTags", 0)):
+        df[col] = names[flags == flag].groupby(level=0).agg(", ".join).reindex(df.index, fill_value="")
+    return df
+
+def legacy_render_walk(df: pd.DataFrame):
+    """The nested-list work the card renderers did for every row on every rerun"""
+    for _, row in df.iterrows():
+        if isinstance(row.get("allNAICSCodes"), list):
+            [n.get("id", "") for n in row["allNAICSCodes"] if isinstance(n, dict)]
+        for col in ("competitionTypes", "contractTypes", "setAsides"):
+            if isinstance(row.get(col), list):
+                [x.get("title", "") for x in row[col] if isinstance(x, dict)]
+        if isinstance(row.get("smartTagObject"), list):
+            [t.get("name", "") for t in row["smartTagObject"] if t.get("isPrimary") == 1]
+            [t.get("name", "") for t in row["smartTagObject"] if t.get("isPrimary") == 0]
+
+def flat_render_walk(df: pd.DataFrame):
+    """Reading the precomputed flat columns per row"""
+    for _, row in df.iterrows():
+        for col in ("allNaicsIds", "competitionTitles", "contractTypeTitles",
+                    "setAsideTitles", "primaryTags", "secondaryTags"):
+            row.get(col)
+
+def _time(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    base = make_frame(rows)
+
+    legacy_load_s = _time(legacy_load, base.copy())
+    flat_load_s = _time(flatten_nested, base.copy())
+    pandas_load_s = _time(pandas_load, base.copy())
+
+    legacy_df = legacy_load(base.copy())
+    flat_df = flatten_nested(base.copy())
+    legacy_walk_s = _time(legacy_render_walk, legacy_df)
+    flat_walk_s = _time(flat_render_walk, flat_df)
+
+    legacy_total = legacy_load_s + reruns * legacy_walk_s
+    flat_total = flat_load_s + reruns * flat_walk_s
+
+    print(f"{rows:,} rows, {reruns} reruns")
+    print(f"{'':<22} {'legacy':>10} {'flattened':>10} {'speedup':>8}")
+    print(f"{'load (s)':<22} {legacy_load_s:>10.3f} {flat_load_s:>10.3f} {legacy_load_s / flat_load_s:>7.1f}x")
+    print(f"{'per-rerun walk (s)':<22} {legacy_walk_s:>10.3f} {flat_walk_s:>10.3f} {legacy_walk_s / flat_walk_s:>7.1f}x")
+    print(f"{'load + reruns (s)':<22} {legacy_total:>10.3f} {flat_total:>10.3f} {legacy_total / flat_total:>7.1f}x")
+    print(f"\nflatten_nested load: {flat_load_s:.3f}s vs pandas .str/explode: {pandas_load_s:.3f}s "
+          f"({pandas_load_s / flat_load_s:.1f}x slower)")
@@ -0,0 +1,302 @@
+"""
+Pluggable result cache shared by every Streamlit replica.
+
+``st.cache_data`` is per process, so each replica of the container app
+re-runs the same Cosmos queries. ``cached`` is a drop-in decorator for the
+data_access query functions that stores pickled results in a backend picked
+by GOVWIN_CACHE_URL:
+
+    memory://                   per-process (the default, same as before)
+    sqlite:///data/cache.db     file shared by the processes of ONE host; the
+                                WAL journal needs shared memory, so never put
+                                it on SMB / Azure Files or any network share
+    redis://host:6379/0         Redis / Azure Cache for Redis (rediss://);
+                                needs the optional ``redis`` package
+
+Entries expire after the decorator's TTL, and each namespace keeps at most
+``max_entries`` of them (oldest evicted first) in the memory and sqlite
+backends. Redis bounds itself: run it with ``maxmemory-policy volatile-lru``
+so only expiring cache entries are evicted, never the generation counters.
+
+``fn.clear()`` invalidates a whole namespace by bumping its generation
+counter (so every replica sees it at once), and ``fn.clear(*args)`` drops a
+single entry. ``try_lock`` lets one replica claim a job (e.g. prewarming)
+for a while. Backend failures are logged and treated as misses, so an
+unreachable cache never breaks a page.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger("govwin.cache")
+
+KEY_PREFIX = "govwin:cache"
+DEFAULT_MAX_ENTRIES = 1024  # per namespace, when the decorator gives no cap
+
+# ─── Backends ─────────────────────────────────────────────────────────────────
+class MemoryBackend:
+    """Process-local LRU per namespace with per-entry expiry"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: Dict[str | None, OrderedDict] = {}
+        self._namespace_of: Dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def _pop(self, key: str):
+        self._data[self._namespace_of.pop(key)].pop(key)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if key not in self._namespace_of:
+                return None
+            entries = self._data[self._namespace_of[key]]
+            expires, value = entries[key]
+            if expires is not None and expires < time.time():
+                self._pop(key)
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int | None,
+            namespace: str | None = None, max_entries: int | None = None):
+        with self._lock:
+            if key in self._namespace_of:
+                self._pop(key)
+            entries = self._data.setdefault(namespace, OrderedDict())
+            entries[key] = (time.time() + ttl if ttl else None, value)
+            self._namespace_of[key] = namespace
+            if namespace is not None:
+                while len(entries) > (max_entries or self.max_entries):
+                    oldest, _ = entries.popitem(last=False)
+                    del self._namespace_of[oldest]
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._namespace_of:
+                self._pop(key)
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        """Set *key* only if it is absent or expired; True when this call set it"""
+        with self._lock:
+            entry = self._data.get(None, {}).get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= time.time()):
+                return False
+            self._data.setdefault(None, OrderedDict())[key] = (time.time() + ttl, value)
+            self._namespace_of[key] = None
+            return True
+
+    def incr(self, key: str) -> int:
+        # Generation counters live outside every namespace, so they are never evicted
+        with self._lock:
+            counters = self._data.setdefault(None, OrderedDict())
+            _, value = counters.get(key, (None, b"0"))
+            value = str(int(value) + 1).encode()
+            counters[key] = (None, value)
+            self._namespace_of[key] = None
+            return int(value)
+
+class SqliteBackend:
+    """
+    Single-file store shared by the processes of one host (local disk only:
+    WAL locking does not work over SMB / Azure Files, so replicas on separate
+    hosts must use Redis instead)
+    """
+
+    PURGE_EVERY = 200  # writes between sweeps of expired rows
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}
+            if "namespace" not in columns:
+                self._conn.execute("ALTER TABLE cache ADD COLUMN namespace TEXT")
+                self._conn.execute("ALTER TABLE cache ADD COLUMN written REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_age ON cache (namespace, written)")
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: int | None,
+            namespace: str | None = None, max_entries: int | None = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO cache (key, value, expires, namespace, written) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires, "
+                "namespace = excluded.namespace, written = excluded.written",
+                (key, value, now + ttl if ttl else None, namespace, now),
+            )
+            if namespace is not None:
+                # Keep only the newest max_entries rows of this namespace
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY written DESC LIMIT ?)",
+                    (namespace, namespace, max_entries or self.max_entries),
+                )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ? AND expires < ?", (key, now))
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires, written) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key: str) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO cache (key, value, expires) VALUES (?, '1', NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)",
+                (key,),
+            )
+            return int(self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()[0])
+
+class RedisBackend:
+    """Redis-compatible server shared by every replica"""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("GOVWIN_CACHE_URL points at Redis but the redis package is not installed") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=2)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int | None,
+            namespace: str | None = None, max_entries: int | None = None):
+        # Bounded server-side by maxmemory + maxmemory-policy volatile-lru
+        self._client.set(key, value, ex=ttl or None)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def add(self, key: str, value: bytes, ttl: int) -> bool:
+        return bool(self._client.set(key, value, ex=ttl, nx=True))
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(key))
+
+def backend_from_url(url: str | None):
+    """Build the backend for a GOVWIN_CACHE_URL value (empty means memory)"""
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "sqlite":
+        return SqliteBackend(parsed.path or "govwin_cache.db")
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported GOVWIN_CACHE_URL scheme: {parsed.scheme}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_url(os.getenv("GOVWIN_CACHE_URL"))
+        return _backend
+
+# ─── Namespaces & decorator ───────────────────────────────────────────────────
+def _generation(namespace: str) -> str:
+    value = get_backend().get(f"{KEY_PREFIX}:gen:{namespace}")
+    return value.decode() if isinstance(value, bytes) else str(value or 0)
+
+def invalidate(namespace: str):
+    """Drop every entry in *namespace* on all replicas"""
+    try:
+        get_backend().incr(f"{KEY_PREFIX}:gen:{namespace}")
+    except Exception as e:
+        logger.warning("Cache invalidation failed for %s: %s", namespace, e)
+
+def try_lock(name: str, ttl: int) -> bool:
+    """
+    Claim *name* for *ttl* seconds; True for the one caller (across every
+    replica sharing the backend) that gets it. The claim is never released
+    early - it doubles as a "done" marker until it expires.
+    """
+    try:
+        return get_backend().add(f"{KEY_PREFIX}:lock:{name}", b"1", ttl)
+    except Exception as e:
+        logger.warning("Cache lock failed for %s: %s", name, e)
+        return False
+
+def _entry_key(namespace: str, generation: str, args: tuple, kwargs: dict) -> str:
+    digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{generation}:{digest}"
+
+def cached(namespace: str, ttl: int | None = None, max_entries: int | None = None):
+    """
+    Cache a function's (picklable) results in the shared backend. Arguments
+    must have a stable repr - strings, numbers and tuples of them. Exceptions
+    are never cached. *max_entries* caps the namespace (default
+    DEFAULT_MAX_ENTRIES) so one busy function cannot evict the others.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = None
+            try:
+                key = _entry_key(namespace, _generation(namespace), args, kwargs)
+                hit = get_backend().get(key)
+                if hit is not None:
+                    return pickle.loads(hit)
+            except Exception as e:
+                logger.warning("Cache read failed for %s: %s", namespace, e)
+
+            result = fn(*args, **kwargs)
+            if key is not None:
+                try:
+                    get_backend().set(key, pickle.dumps(result), ttl, namespace, max_entries)
+                except Exception as e:
+                    logger.warning("Cache write failed for %s: %s", namespace, e)
+            return result
+
+        def clear(*args, **kwargs):
+            """Drop one entry (with arguments) or the whole namespace (without)"""
+            if not args and not kwargs:
+                invalidate(namespace)
+                return
+            try:
+                get_backend().delete(_entry_key(namespace, _generation(namespace), args, kwargs))
+            except Exception as e:
+                logger.warning("Cache delete failed for %s: %s", namespace, e)
+
+        wrapper.clear = clear
+        return wrapper
+    return decorator
@@ -6,10 +6,17 @@ Each opportunity type (GovWin Tracked, SAM.gov, etc.) has its own specialized re
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import uuid
-from azure.cosmos.exceptions import CosmosResourceNotFoundError, CosmosAccessConditionFailedError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from azure.core.exceptions import AzureError
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceNotFoundError,
+)
 
-from data_access import cosmos_containers
+from data_access import cosmos_containers, invalidate_opps_cache, refresh_opportunity
+from diagnostics import track
 
 # ─── URL validation and utility functions ────────────────────────────────────
 def is_valid_url(url):
@@ -59,35 +66,140 @@ def copy_to_clipboard_button(text: str, label: str = "📋", tooltip: str = "Cop
     components.html(btn_html, height=30, width=40)
 
 # ─── Feedback saving functionality ────────────────────────────────────────────
-def save_fb(opp_id: str, rel: str, pur: str):
-    if rel == pur == "Unrated":
-        return
-    
-    container = cosmos_containers()["opps"]
-    try:
-        doc = container.read_item(item=opp_id, partition_key=opp_id)
-        
-        ops = []
-        if rel != "Unrated":
-            ops.append({"op": "add", "path": "/relevant", "value": rel})
-        if pur != "Unrated":
-            ops.append({"op": "add", "path": "/pursued", "value": pur})
-        
-        container.patch_item(
+REL_CANON = {"✅ Yes": "Yes", "❌ No": "No"}
+PUR_CANON = {"🚀 Yes": "Yes", "💤 No": "No"}
+FLUSH_WORKERS = 8
+
+def _patch_feedback(container, opp_id: str, rel: str, pur: str, etag: str | None) -> dict:
+    """One (conditional, if *etag* is set) feedback patch; Cosmos errors propagate"""
+    ops = []
+    if rel != "Unrated":
+        ops.append({"op": "add", "path": "/relevant", "value": rel})
+    if pur != "Unrated":
+        ops.append({"op": "add", "path": "/pursued", "value": pur})
+    with track("save_feedback", container, id=opp_id, conditional=bool(etag)) as call:
+        doc = container.patch_item(
             item=opp_id, 
             partition_key=opp_id,
             patch_operations=ops,
-            if_match=doc["_etag"]
+            if_match=etag,
+            response_hook=call.hook,
         )
-        return True
+        call.response()
+    return doc
+
+def save_fb(opp_id: str, rel: str, pur: str, etag: str | None = None):
+    """
+    Save feedback as a single patch. With *etag* (the ``_etag`` of the loaded
+    row) the patch is conditional; on a conflict the card is refreshed from
+    the stored document instead. Returns the patched document, or a falsy
+    value when nothing was saved.
+    """
+    if rel == pur == "Unrated":
+        return
+    
+    try:
+        doc = _patch_feedback(cosmos_containers()["opps"], opp_id, rel, pur, etag)
+        invalidate_opps_cache()
+        return doc
         
     except CosmosResourceNotFoundError:
         st.error("Opportunity not found – refresh data.")
         return False
     except CosmosAccessConditionFailedError:
-        st.warning("Someone else updated this record first; refresh to see changes.")
+        _refresh_card(opp_id)
         return False
 
+# ─── Feedback queue ───────────────────────────────────────────────────────────
+def _feedback_queue() -> dict:
+    """{opp_id: {"relevant", "pursued", "etag"}} of unsaved card edits"""
+    return st.session_state.setdefault("fb_queue", {})
+
+def _queue_feedback(opp_id: str, etag: str | None):
+    """Radio on_change: record the card's current choice, or drop it once back to unrated"""
+    rel = REL_CANON.get(st.session_state.get(f"rel_{opp_id}"), "Unrated")
+    pur = PUR_CANON.get(st.session_state.get(f"pur_{opp_id}"), "Unrated")
+    if rel == pur == "Unrated":
+        _feedback_queue().pop(opp_id, None)
+    else:
+        _feedback_queue()[opp_id] = {"relevant": rel, "pursued": pur, "etag": etag}
+
+def flush_feedback_queue() -> dict:
+    """
+    Save every queued edit with concurrent conditional patches. Each
+    opportunity is its own partition, so a patch is already the whole
+    transaction for it. Returns {opp_id: "saved" | "conflict" | "missing" |
+    "error"}; conflicted cards are refreshed, failed ones stay queued.
+    """
+    queue = _feedback_queue()
+    if not queue:
+        return {}
+
+    container = cosmos_containers()["opps"]
+    results, saved_docs = {}, {}
+    # Workers share the script context so their diagnostics reach this session
+    with ThreadPoolExecutor(
+        max_workers=min(FLUSH_WORKERS, len(queue)),
+        initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()),
+    ) as pool:
+        futures = {
+            pool.submit(_patch_feedback, container, opp_id, e["relevant"], e["pursued"], e["etag"]): opp_id
+            for opp_id, e in queue.items()
+        }
+        for future in as_completed(futures):
+            opp_id = futures[future]
+            try:
+                saved_docs[opp_id] = future.result()
+                results[opp_id] = "saved"
+            except CosmosAccessConditionFailedError:
+                results[opp_id] = "conflict"
+            except CosmosResourceNotFoundError:
+                results[opp_id] = "missing"
+            except AzureError:
+                # HTTP errors, timeouts and connection failures: only this entry stays queued
+                results[opp_id] = "error"
+
+    # Session state is only touched from this (the script) thread
+    for opp_id, doc in saved_docs.items():
+        _update_session_row(opp_id, {col: doc.get(col) for col in ("relevant", "pursued", "_etag")})
+    for opp_id, status in results.items():
+        if status == "conflict":
+            _refresh_card(opp_id)
+        if status != "error":
+            queue.pop(opp_id, None)
+    if saved_docs:
+        invalidate_opps_cache()
+    return results
+
+def _update_session_row(opp_id: str, values: dict):
+    """Write *values* into the loaded row for *opp_id*, if it is still loaded"""
+    df = st.session_state.get("df")
+    if df is None or df.empty:
+        return
+    mask = df["id"] == opp_id
+    for col, value in values.items():
+        if col in df:
+            df.loc[mask, col] = value
+
+def _refresh_card(opp_id: str):
+    """Reload one opportunity after a write conflict and reset its feedback widgets"""
+    doc = refresh_opportunity(opp_id)
+    if doc is not None:
+        _update_session_row(opp_id, {col: doc.get(col) for col in ("relevant", "pursued", "_etag")})
+    for key in (f"rel_{opp_id}", f"pur_{opp_id}"):
+        st.session_state.pop(key, None)
+    st.session_state[f"fb_notice_{opp_id}"] = "Someone else updated this record first; showing their changes."
+
+def _current_feedback(row) -> dict:
+    """Feedback state for a card, preferring the session row (updated by saves) over *row*"""
+    values = {col: row.get(col) for col in ("relevant", "pursued", "_etag")}
+    df = st.session_state.get("df")
+    if df is not None and not df.empty and "id" in df:
+        match = df[df["id"] == row["id"]]
+        if not match.empty:
+            values.update({col: match.iloc[0][col] for col in values if col in match})
+    return values
+
 # ─── Opportunity type-specific render functions ───────────────────────────────
 def render_tracked_card(row, idx):
     """Render GovWin Tracked opportunity with all its rich data"""
@@ -99,26 +211,20 @@ def render_tracked_card(row, idx):
         st.markdown(f"**Status:** {row.get('status')}")
         
         # Primary NAICS
-        if row.get('primaryNAICS') and isinstance(row['primaryNAICS'], dict):
-            naics_id = row['primaryNAICS'].get('id', '')
-            naics_title = row['primaryNAICS'].get('title', '')
-            st.markdown(f"**Primary NAICS:** {naics_id} – {naics_title}")
+        if row.get('naicsCode'):
+            st.markdown(f"**Primary NAICS:** {row.get('naicsCode')} – {row.get('naicsTitle') or ''}")
         
         # Duration
         if row.get('duration'):
             st.markdown(f"**Duration:** {row.get('duration')}")
         
         # Contract Types (NEW - this is what we wanted!)
-        if row.get("contractTypes") and isinstance(row["contractTypes"], list):
-            contract_types = [ct.get("title", "") for ct in row["contractTypes"] if isinstance(ct, dict)]
-            if contract_types:
-                st.markdown(f"**Contract Types:** {', '.join(contract_types)}")
+        if row.get("contractTypeTitles"):
+            st.markdown(f"**Contract Types:** {row['contractTypeTitles']}")
         
         # Competition Types (Set-Asides for GovWin)
-        if row.get("competitionTypes") and isinstance(row["competitionTypes"], list):
-            comp_types = [ct.get("title", "") for ct in row["competitionTypes"] if isinstance(ct, dict)]
-            if comp_types:
-                st.markdown(f"**Competition:** {', '.join(comp_types)}")
+        if row.get("competitionTitles"):
+            st.markdown(f"**Competition:** {row['competitionTitles']}")
         
         # Type of Award
         if row.get('typeOfAward'):
@@ -174,10 +280,8 @@ def render_sam_card(row, idx):
             st.markdown(f"**Response Deadline:** {response_date}")
         
         # Set-Asides (SAM.gov specific)
-        if row.get('setAsides') and isinstance(row['setAsides'], list):
-            set_asides = [sa.get('title', '') for sa in row['setAsides'] if isinstance(sa, dict)]
-            if set_asides:
-                st.markdown(f"**Set-Asides:** {', '.join(set_asides)}")
+        if row.get('setAsideTitles'):
+            st.markdown(f"**Set-Asides:** {row['setAsideTitles']}")
         
         _render_common_fields(row)
     
@@ -245,21 +349,15 @@ def _render_common_fields(row):
     
     st.markdown(f"**Search Term:** `{row.get('searchTerm')}`")
     
-    # Show all NAICS codes if available
-    if row.get('allNAICSCodes') and isinstance(row['allNAICSCodes'], list):
-        all_naics = [naics.get('id', '') for naics in row['allNAICSCodes'] if isinstance(naics, dict)]
-        if len(all_naics) > 1:
-            st.markdown(f"**All NAICS:** {', '.join(all_naics)}")
+    # Show all NAICS codes if there is more than the primary one
+    if ", " in (row.get('allNaicsIds') or ""):
+        st.markdown(f"**All NAICS:** {row['allNaicsIds']}")
     
     # Smart tags with primary/secondary separation
-    if row.get('smartTagObject'):
-        primary_tags = [tag.get('name', '') for tag in row['smartTagObject'] if tag.get('isPrimary') == 1]
-        secondary_tags = [tag.get('name', '') for tag in row['smartTagObject'] if tag.get('isPrimary') == 0]
-        
-        if primary_tags:
-            st.markdown(f"**Primary Tags:** {', '.join(primary_tags)}")
-        if secondary_tags:
-            st.markdown(f"**Secondary Tags:** {', '.join(secondary_tags[:3])}")
+    if row.get('primaryTags'):
+        st.markdown(f"**Primary Tags:** {row['primaryTags']}")
+    if row.get('secondaryTags'):
+        st.markdown(f"**Secondary Tags:** {', '.join(row['secondaryTags'].split(', ')[:3])}")
 
     if row.get("description") and pd.notna(row.get("description")):
         st.markdown("**Description:**")
@@ -269,12 +367,18 @@ def _render_common_fields(row):
     # Fixed sourceURL with validation
     safe_link_button("🔗 View on SAM/GovWin", row.get("sourceURL"))
 
+@st.fragment
 def _render_feedback_section(row, idx):
-    """Render the feedback section for all opportunity types"""
+    """Render the feedback section for all opportunity types.
+    Runs as a fragment so radio changes and saves rerun only this card's form."""
     st.markdown("### Feedback")
+    notice = st.session_state.pop(f"fb_notice_{row['id']}", None)
+    if notice:
+        st.warning(notice)
     
-    current_rel = row.get("relevant", "Unrated")
-    current_pur = row.get("pursued", "Unrated")
+    current = _current_feedback(row)
+    current_rel = current.get("relevant") or "Unrated"
+    current_pur = current.get("pursued") or "Unrated"
     
     rel_options = ["Unrated", "✅ Yes", "❌ No"]
     pur_options = ["Unrated", "🚀 Yes", "💤 No"]
@@ -285,20 +389,33 @@ def _render_feedback_section(row, idx):
     rel_index = rel_map.get(current_rel, 0)
     pur_index = pur_map.get(current_pur, 0)
     
-    rel = st.radio("Relevant?", rel_options, index=rel_index, key=f"rel_{row['id']}")
-    pur = st.radio("Pursued?", pur_options, index=pur_index, key=f"pur_{row['id']}")
+    # Every change is queued for "Save all"; Save writes just this card now
+    queue_args = (str(row["id"]), current.get("_etag"))
+    rel = st.radio("Relevant?", rel_options, index=rel_index, key=f"rel_{row['id']}",
+                   on_change=_queue_feedback, args=queue_args)
+    pur = st.radio("Pursued?", pur_options, index=pur_index, key=f"pur_{row['id']}",
+                   on_change=_queue_feedback, args=queue_args)
     
     if st.button("Save", key=f"save_{row['id']}", use_container_width=True):
-        canon_rel = {"✅ Yes": "Yes", "❌ No": "No"}.get(rel, "Unrated")
-        canon_pur = {"🚀 Yes": "Yes", "💤 No": "No"}.get(pur, "Unrated")
+        canon_rel = REL_CANON.get(rel, "Unrated")
+        canon_pur = PUR_CANON.get(pur, "Unrated")
         
-        if save_fb(str(row["id"]), canon_rel, canon_pur):
-            if canon_rel != "Unrated":
-                st.session_state.df.at[idx, "relevant"] = canon_rel
-            if canon_pur != "Unrated":
-                st.session_state.df.at[idx, "pursued"] = canon_pur
-            
+        saved = save_fb(str(row["id"]), canon_rel, canon_pur, etag=current.get("_etag"))
+        if saved is not None:
+            _feedback_queue().pop(str(row["id"]), None)
+        if saved:
+            _update_session_row(str(row["id"]), {
+                "relevant": saved.get("relevant"),
+                "pursued": saved.get("pursued"),
+                "_etag": saved.get("_etag"),
+            })
             st.success("Saved!")
+        elif saved is False and f"fb_notice_{row['id']}" in st.session_state:
+            # Conflict refresh reset this card's widgets; redraw with the stored values
+            st.rerun()
+
+    if str(row["id"]) in _feedback_queue():
+        st.caption("📝 Queued – save now or with **Save all feedback**")
 
 # ─── Main dispatcher with ChatGPT's pattern ──────────────────────────────────
 CARD_RENDERERS = {
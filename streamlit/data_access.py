@@ -4,12 +4,23 @@ Handles Cosmos DB connections, querying, and data processing.
 """
 
 import os
-from datetime import datetime
-from typing import Dict, List
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
 
 import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from azure.cosmos import CosmosClient
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+
+from diagnostics import track
+from cache_backend import cached
+from text_utils import HTML_TAG, SEARCH_TERM
+
+logger = logging.getLogger("govwin.data_access")
 
 # ─── Source name normalization ────────────────────────────────────────────────
 SOURCE_ALIASES = {
@@ -31,11 +42,16 @@ def cosmos_client() -> CosmosClient:
     key = st.secrets.get("COSMOS_KEY", os.getenv("COSMOS_KEY"))
     return CosmosClient(url, key)
 
+# Also the container govwin-ingest feeds the derived views from (same setting)
+OPPORTUNITIES_CONTAINER = os.getenv("OPPORTUNITIES_CONTAINER", "opportunities")
+
 @st.cache_resource(show_spinner=False)
 def cosmos_containers():
     db = cosmos_client().get_database_client("govwin")
     return {
-        "opps": db.get_container_client("opportunities"),
+        "opps": db.get_container_client(OPPORTUNITIES_CONTAINER),
+        "state": db.get_container_client("ingest_state"),
+        "views": db.get_container_client("derived_views"),
     }
 
 # ─── Get filter options from actual data ─────────────────────────────────────
@@ -56,9 +72,47 @@ def merge_with_preferred(actual_values, preferred_values):
     
     return merged
 
-@st.cache_data(ttl=300)
+FILTER_OPTIONS_VIEW = "filter_options"  # maintained by govwin-ingest/derived_views.py
+
+def _filter_options_from_view() -> Dict | None:
+    """
+    Filter values from the change-feed maintained view: one single-partition
+    read of its shard documents. None when the view has not been populated.
+    """
+    container = cosmos_containers()["views"]
+    with track("filter_options_view", container) as call:
+        shards = [
+            doc for page in call.pages(container.query_items(
+                "SELECT * FROM c", partition_key=FILTER_OPTIONS_VIEW, response_hook=call.hook
+            ).by_page()) for doc in page
+        ]
+    if not shards:
+        return None
+
+    def _union(field):
+        return sorted({v for doc in shards for v in doc.get(field) or [] if v})
+
+    naics = _union("naics")  # primary + additional codes
+    return {
+        "naics": naics,
+        "all_naics": naics,
+        "combined_naics": naics,
+        "psc": _union("psc"),
+        "status": _union("status"),
+        "sources": sorted({normalize_source(v) for v in _union("sources")}),
+        "procurement": _union("procurement"),
+    }
+
+@cached("filter_options", ttl=300)
 def get_filter_options():
-    """Get available filter values from the database"""
+    """Get available filter values, from the derived view or else by scanning the database"""
+    try:
+        options = _filter_options_from_view()
+        if options:
+            return options
+    except Exception as e:
+        logger.warning("Filter options view unavailable, scanning instead: %s", e)
+
     try:
         container = cosmos_containers()["opps"]
         
@@ -74,7 +128,13 @@ def get_filter_options():
         options = {}
         for key, query in queries.items():
             try:
-                results = list(container.query_items(query, enable_cross_partition_query=True))
+                with track("filter_options", container, key=key) as call:
+                    results = [
+                        r for page in call.pages(container.query_items(
+                            query, enable_cross_partition_query=True, response_hook=call.hook
+                        ).by_page())
+                        for r in page
+                    ]
                 if key in ["naics", "all_naics"]:
                     # Extract NAICS IDs
                     if key == "naics":
@@ -140,49 +200,271 @@ def process_dataframe(df):
     
     return df
 
-def build_query(start: datetime, end: datetime, flt: Dict) -> tuple[str, List[Dict]]:
+def _epoch(value: datetime) -> int:
+    """Epoch seconds for a naive-UTC or tz-aware datetime"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+# ─── Field projections ────────────────────────────────────────────────────────
+# List queries fetch only what the collapsed list needs: the expander header,
+# process_dataframe (value/date unification), sort, search-within-results,
+# summary metrics and feedback state. Card details come from a point read
+# when a card is opened (see get_opportunity_detail).
+LIST_FIELDS = [
+    "id", "title", "source", "status", "procurement", "searchTerm",
+    "contractValue", "oppValue",
+    "originalPostedDt", "createdDate", "updateDate", "ingestedAt",
+    "govEntity", "primaryNAICS", "allNAICSCodes",
+    "pscCode", "classificationCodeDesc", "solicitationNumber",
+    "relevant", "pursued", "_etag", "_ts",
+    "postedDate", "ingestedAtEpoch",  # raw sort values for the keyset cursor
+]
+
+# Search-within-results covers the first 600 description characters; one
+# extra keeps the card's "…" check working
+LIST_DESCRIPTION_CHARS = 601
+
+DETAIL_FIELDS = LIST_FIELDS + [
+    "sourceURL", "duration", "contractTypes", "competitionTypes", "setAsides",
+    "typeOfAward", "primaryRequirement", "awardDate", "solicitationDate",
+    "responseDate", "smartTagObject",
+    "description", "links", "smartTag", "country", "iqOppId", "type",
+    "additionalNaics", "contracts", "contacts", "placesOfPerformance",
+    "milestones", "companies", "relatedDocuments",
+]
+
+PROJECTIONS = {"list": LIST_FIELDS, "detail": DETAIL_FIELDS}
+
+def build_projection(view: str = "list") -> str:
+    """SELECT list for a projection set ("list" or "detail")"""
+    columns = [f"c.{name}" for name in PROJECTIONS[view]]
+    if view == "list":
+        columns.append(f"LEFT(c.description, {LIST_DESCRIPTION_CHARS}) AS description")
+    return ", ".join(columns)
+
+# ─── Nested field flattening ──────────────────────────────────────────────────
+# Plain list comprehensions over each column, not pandas .str / explode /
+# groupby: the cells are Python dicts and lists, so the "vectorized" pandas
+# forms loop in Python anyway and measured ~14x slower (see bench_flatten.py).
+def _values(df: pd.DataFrame, col: str) -> list:
+    """Column values as a plain list (all None when the projection omitted it)"""
+    return df[col].tolist() if col in df else [None] * len(df)
+
+def _dict_get(values: list, key: str) -> list:
+    return [v.get(key) if isinstance(v, dict) else None for v in values]
+
+def _join_titles(values: list, key: str = "title") -> list:
+    """', '-joined *key* of every dict in each list cell ('' when none)"""
+    return [
+        ", ".join([str(x.get(key, "")) for x in v if isinstance(x, dict)]) if isinstance(v, list) else ""
+        for v in values
+    ]
+
+def _split_tags(values: list) -> tuple[list, list]:
+    """(primary, secondary) ', '-joined smart tag names per row, in one pass"""
+    primary, secondary = [], []
+    for v in values:
+        p, s = [], []
+        if isinstance(v, list):
+            for t in v:
+                if isinstance(t, dict):
+                    flag = t.get("isPrimary")
+                    if flag == 1:
+                        p.append(t.get("name", ""))
+                    elif flag == 0:
+                        s.append(t.get("name", ""))
+        primary.append(", ".join(p))
+        secondary.append(", ".join(s))
+    return primary, secondary
+
+def flatten_nested(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Single normalization pass producing the flat columns the cards and search read:
+    agency, naicsCode, naicsTitle, allNaicsIds, setAsideTitles, competitionTitles,
+    contractTypeTitles, primaryTags and secondaryTags.
+    """
+    primary_naics = _values(df, "primaryNAICS")
+
+    df["agency"] = _dict_get(_values(df, "govEntity"), "title")
+    df["naicsCode"] = _dict_get(primary_naics, "id")
+    df["naicsTitle"] = _dict_get(primary_naics, "title")
+    df["allNaicsIds"] = _join_titles(_values(df, "allNAICSCodes"), key="id")
+    df["setAsideTitles"] = _join_titles(_values(df, "setAsides"))
+    df["competitionTitles"] = _join_titles(_values(df, "competitionTypes"))
+    df["contractTypeTitles"] = _join_titles(_values(df, "contractTypes"))
+    df["primaryTags"], df["secondaryTags"] = _split_tags(_values(df, "smartTagObject"))
+    return df
+
+# ─── Session memory compaction ────────────────────────────────────────────────
+# Columns the list, cards, metrics, sort and search actually read once the
+# nested fields are flattened; everything else is dropped from session state.
+SESSION_FIELDS = [
+    "id", "title", "source", "status", "procurement", "searchTerm",
+    "contractValue", "sourceURL", "postedDate", "updateDate", "ingestedAt",
+    "agency", "naicsCode", "naicsTitle", "allNaicsIds",
+    "pscCode", "classificationCodeDesc", "solicitationNumber",
+    "duration", "typeOfAward", "primaryRequirement",
+    "awardDate", "solicitationDate", "responseDate",
+    "setAsideTitles", "competitionTitles", "contractTypeTitles",
+    "primaryTags", "secondaryTags", "description",
+    "relevant", "pursued", "_etag", "_ts", "searchText", "searchRank",
+]
+
+# Low-cardinality text columns stored as categoricals
+CATEGORICAL_FIELDS = ["source", "status", "pscCode", "searchTerm", "agency"]
+
+def compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Build query with mixed AND/OR logic:
+    Shrink a prepared frame for session state: drop unused columns and store
+    low-cardinality text as categoricals. Byte counts before/after are kept
+    in ``df.attrs["memory"]``.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    df = df[[c for c in SESSION_FIELDS if c in df.columns]].copy()
+    for col in CATEGORICAL_FIELDS:
+        if col in df and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            # "" rather than NaN keeps `if row.get(col)` checks in the cards falsy
+            df[col] = df[col].fillna("").astype(str).astype("category")
+    df.attrs["memory"] = {"before": before, "after": int(df.memory_usage(deep=True).sum())}
+    return df
+
+def concat_pages(pages: List[pd.DataFrame]) -> pd.DataFrame:
+    """Combine processed pages into one compacted frame, summing memory stats"""
+    pages = [p for p in pages if not p.empty]
+    if not pages:
+        return pd.DataFrame()
+    if len(pages) == 1:
+        return pages[0]
+    before = sum(p.attrs.get("memory", {}).get("before", 0) for p in pages)
+    # Category sets differ between pages, so concat falls back to object first
+    merged = pd.concat(
+        [p.astype({c: "object" for c in CATEGORICAL_FIELDS if c in p}) for p in pages],
+        ignore_index=True,
+    )
+    merged = compact_dataframe(merged)
+    merged.attrs["memory"]["before"] = before
+    return merged
+
+def merge_pages(df: pd.DataFrame, more: pd.DataFrame) -> pd.DataFrame:
+    """Append a page to the session frame, re-compacting and summing memory stats"""
+    if not df.empty and not more.empty:
+        # A delta refresh may already have pulled some of this page's rows in
+        more = more[~more["id"].isin(df["id"])]
+    return concat_pages([df, more])
+
+def latest_ts(df: pd.DataFrame) -> int | None:
+    """Newest Cosmos ``_ts`` in a loaded frame - the watermark for delta refreshes"""
+    if df.empty or "_ts" not in df:
+        return None
+    ts = pd.to_numeric(df["_ts"], errors="coerce").max()
+    return None if pd.isna(ts) else int(ts)
+
+def merge_delta(df: pd.DataFrame, delta: pd.DataFrame) -> tuple[pd.DataFrame, int, int]:
+    """
+    Merge changed documents into the session frame by id: changed rows are
+    replaced where they stand and new ones appended.
+    Returns (merged frame, rows added, rows updated).
+    """
+    if delta.empty:
+        return df, 0, 0
+    if df.empty:
+        return delta, len(delta), 0
+    delta = delta.drop_duplicates("id", keep="last")
+    changed = df["id"].isin(delta["id"])
+    updated = int(changed.sum())
+    positions = {opp_id: pos for pos, opp_id in enumerate(df["id"])}
+    # Updated rows take their old row's position; new rows go after everything
+    order = [pos for pos, keep in enumerate(~changed) if keep] + [
+        positions.get(opp_id, len(df) + i) for i, opp_id in enumerate(delta["id"])
+    ]
+    merged = concat_pages([df[~changed], delta])
+    merged = merged.iloc[pd.Series(order).argsort().to_numpy()].reset_index(drop=True)
+    return merged, len(delta) - updated, updated
+
+# ─── Search-within-results index ──────────────────────────────────────────────
+# Scalar text columns folded into the precomputed search text
+SEARCH_TEXT_FIELDS = [
+    "title", "agency", "solicitationNumber", "naicsCode", "naicsTitle",
+    "allNaicsIds", "pscCode", "classificationCodeDesc",
+]
+
+def build_search_text(df: pd.DataFrame) -> pd.Series:
+    """One lowercase string per row over title, agency, solicitation #, NAICS/PSC and description"""
+    missing = pd.Series("", index=df.index, dtype="object")
+    parts = [df.get(col, missing).fillna("").astype(str) for col in SEARCH_TEXT_FIELDS]
+    parts.append(
+        df.get("description", missing).fillna("").astype(str).str.replace(HTML_TAG, " ", regex=True)
+    )
+
+    text = parts[0]
+    for part in parts[1:]:
+        text = text + " " + part
+    return text.str.replace(r"\s+", " ", regex=True).str.strip().str.lower()
+
+def search_mask(df: pd.DataFrame, query: str) -> pd.Series:
+    """
+    Rows whose search text contains every term in *query* (AND semantics).
+    Double-quoted phrases are matched as a whole.
+    """
+    mask = pd.Series(True, index=df.index)
+    if "searchText" not in df:
+        return mask
+    for phrase, word in SEARCH_TERM.findall(query.lower()):
+        mask &= df["searchText"].str.contains(phrase or word, regex=False)
+    return mask
+
+def build_where(
+    start: datetime, end: datetime, flt: Dict, since_ts: int | None = None
+) -> tuple[str, List[Dict]]:
+    """
+    Build the WHERE clause with mixed AND/OR logic:
     - NAICS and PSC use OR logic (broad opportunity matching)
     - Source, Status, and Procurement use AND logic (restrictive filtering)
+    Shared by the list query and the summary aggregates so both see the same rows.
+    With *since_ts*, only documents written after that Cosmos ``_ts`` match.
     """
-    # Date filter
-    date_filter = "c.ingestedAt >= @start AND c.ingestedAt <= @end"
+    # Date filter - numeric epoch copy of ingestedAt (see indexing_policy.py)
+    date_filter = "c.ingestedAtEpoch >= @start AND c.ingestedAtEpoch <= @end"
     
     params = [
-        {"name": "@start", "value": start.isoformat()},
-        {"name": "@end",   "value": end.isoformat()},
+        {"name": "@start", "value": _epoch(start)},
+        {"name": "@end",   "value": _epoch(end)},
     ]
     
     filter_conditions = []
     
-    # Helper for OR-within each filter category
-    def _add_filter_group(col_expr: str, items: list[str], tag: str):
-        if not items:
-            return None
-        ors = []
+    # Each filter category compiles to a single indexed predicate: IN on scalar
+    # paths, ARRAY_CONTAINS_ANY on the flat naicsIds array written by ingest
+    def _params(items: list[str], tag: str) -> str:
+        names = []
         for i, v in enumerate(items):
-            ors.append(col_expr.format(i=i))
+            names.append(f"@{tag}{i}")
             params.append({"name": f"@{tag}{i}", "value": v})
-        return f"({' OR '.join(ors)})"
+        return ", ".join(names)
+
+    def _add_filter_group(field: str, items: list[str], tag: str):
+        if not items:
+            return None
+        return f"c.{field} IN ({_params(items, tag)})"
+
+    def _add_array_filter(field: str, items: list[str], tag: str):
+        if not items:
+            return None
+        return f"ARRAY_CONTAINS_ANY(c.{field}, {_params(items, tag)})"
     
     # 1. OPPORTUNITY RELEVANCE (OR logic) - Cast wide net for relevant work
     relevance_conditions = []
     
-    # NAICS filtering - check allNAICSCodes array
-    if flt["naics"]:
-        naics_conditions = []
-        for i, naics_code in enumerate(flt["naics"]):
-            naics_conditions.append(f"EXISTS(SELECT VALUE n FROM n IN c.allNAICSCodes WHERE n.id = @naics{i})")
-            params.append({"name": f"@naics{i}", "value": naics_code})
-        if naics_conditions:
-            relevance_conditions.append(f"({' OR '.join(naics_conditions)})")
+    # NAICS filtering - any of the selected codes in naicsIds (primary + additional)
+    naics_filter = _add_array_filter("naicsIds", flt["naics"], "naics")
+    if naics_filter:
+        relevance_conditions.append(naics_filter)
     
     # PSC filtering - exact match on PSC code
-    if flt["psc"]:
-        psc_filter = _add_filter_group("c.pscCode = @psc{i}", flt["psc"], "psc")
-        if psc_filter:
-            relevance_conditions.append(psc_filter)
+    psc_filter = _add_filter_group("pscCode", flt["psc"], "psc")
+    if psc_filter:
+        relevance_conditions.append(psc_filter)
     
     # Combine NAICS and PSC with OR (show opportunities with EITHER relevant NAICS OR relevant PSC)
     if relevance_conditions:
@@ -194,58 +476,606 @@ def build_query(start: datetime, end: datetime, flt: Dict) -> tuple[str, List[Di
     # Source filtering (AND with relevance)
     if flt["src"]:
         normalized_sources = [normalize_source(src) for src in flt["src"]]
-        src_filter = _add_filter_group("c.source = @src{i}", normalized_sources, "src")
+        src_filter = _add_filter_group("source", normalized_sources, "src")
         if src_filter:
             filter_conditions.append(src_filter)
     
     # Status filtering (AND with relevance)
     if flt["status"]:
-        status_filter = _add_filter_group("c.status = @status{i}", flt["status"], "status")
+        status_filter = _add_filter_group("status", flt["status"], "status")
         if status_filter:
             filter_conditions.append(status_filter)
     
     # Procurement filtering (AND with relevance)
     if flt["procurement"]:
-        proc_filter = _add_filter_group("c.procurement = @procurement{i}", flt["procurement"], "procurement")
+        proc_filter = _add_filter_group("procurement", flt["procurement"], "procurement")
         if proc_filter:
             filter_conditions.append(proc_filter)
     
+    # Delta refresh - only documents changed since the loaded set
+    if since_ts is not None:
+        filter_conditions.append("c._ts > @since")
+        params.append({"name": "@since", "value": int(since_ts)})
+    
     # Combine all conditions with AND
     if filter_conditions:
         where_clause = f"{date_filter} AND {' AND '.join(filter_conditions)}"
     else:
         where_clause = date_filter
     
-    return f"SELECT * FROM c WHERE {where_clause}", params
+    return where_clause, params
+
+# Sidebar sort option -> document path. Ingest normalizes these to numbers /
+# fixed-width UTC strings so Cosmos orders them correctly (see function_app.py)
+SORT_PATHS = {
+    "ingestedAt": "ingestedAtEpoch",
+    "postedDate": "postedDate",
+    "contractValue": "contractValue",
+    "updateDate": "updateDate",
+}
+DEFAULT_SORT = "ingestedAt"
+
+def build_order_by(sort_by: str, ascending: bool = False) -> str:
+    """
+    ORDER BY for a sidebar sort option. Ties break on the unique id in the
+    same direction, so (value, id) is a total order that keyset paging can
+    resume from. Needs the (field, id) composite indexes from
+    indexing_policy.py; until ``apply`` has run, Cosmos rejects the query and
+    the callers below fall back to sorting locally.
+    """
+    direction = "ASC" if ascending else "DESC"
+    return f"ORDER BY c.{SORT_PATHS[sort_by]} {direction}, c.id {direction}"
+
+def build_keyset(sort_by: str, ascending: bool, after: tuple, params: List[Dict]) -> str:
+    """
+    Predicate for the rows that follow *after* - the (sort value, id) of the
+    previous page's last row - in build_order_by order. Cosmos sorts null
+    below every number and string, and comparing null with < or > is never
+    true, so null values get their own branch.
+    """
+    value, after_id = after
+    path = f"c.{SORT_PATHS[sort_by]}"
+    op = ">" if ascending else "<"
+    params.append({"name": "@afterId", "value": after_id})
+    if value is None:
+        if ascending:
+            return f"((IS_NULL({path}) AND c.id > @afterId) OR NOT IS_NULL({path}))"
+        return f"(IS_NULL({path}) AND c.id < @afterId)"
+    params.append({"name": "@afterValue", "value": value})
+    keyset = f"{path} {op} @afterValue OR ({path} = @afterValue AND c.id {op} @afterId)"
+    return f"({keyset})" if ascending else f"({keyset} OR IS_NULL({path}))"
+
+def build_query(
+    start: datetime,
+    end: datetime,
+    flt: Dict,
+    view: str = "list",
+    since_ts: int | None = None,
+    sort_by: str | None = None,
+    ascending: bool = False,
+    top: int | None = None,
+    after: tuple | None = None,
+) -> tuple[str, List[Dict]]:
+    """
+    Select the requested projection set for every opportunity matching the
+    filters, ordered server-side by *sort_by* and limited to *top* rows.
+    With *after* (a keyset cursor, see build_keyset) only the rows following
+    it in *sort_by* order match.
+    """
+    where_clause, params = build_where(start, end, flt, since_ts)
+    if after is not None:
+        where_clause += f" AND {build_keyset(sort_by, ascending, after, params)}"
+    select = "SELECT"
+    if top is not None:
+        select += " TOP @top"
+        params.append({"name": "@top", "value": int(top)})
+    query = f"{select} {build_projection(view)} FROM c WHERE {where_clause}"
+    if sort_by:
+        query += f" {build_order_by(sort_by, ascending)}"
+    return query, params
+
+# Same fallback as process_dataframe: contractValue, else oppValue, else 0
+VALUE_EXPR = "(IS_NUMBER(c.contractValue) ? c.contractValue : (IS_NUMBER(c.oppValue) ? c.oppValue : 0))"
+
+def build_aggregate_queries(start: datetime, end: datetime, flt: Dict) -> Dict[str, tuple[str, List[Dict]]]:
+    """Single-value COUNT and SUM queries over the same rows as build_query"""
+    where_clause, params = build_where(start, end, flt)
+    return {
+        "count": (f"SELECT VALUE COUNT(1) FROM c WHERE {where_clause}", params),
+        "total_value": (f"SELECT VALUE SUM({VALUE_EXPR}) FROM c WHERE {where_clause}", params),
+    }
 
 # ─── Load opportunities ───────────────────────────────────────────────────────
-def fetch_opps(start: datetime, end: datetime, flt: Dict) -> pd.DataFrame:
-    q, p = build_query(start, end, flt)
-    
+PAGE_SIZE = 50
+
+def _filter_summary(flt: Dict) -> str:
+    """Compact description of the active filters for diagnostics events"""
+    parts = []
+    for key, values in flt.items():
+        if values:
+            shown = ",".join(map(str, values[:3])) + (f"+{len(values) - 3}" if len(values) > 3 else "")
+            parts.append(f"{key}={shown}")
+    return "; ".join(parts) or "none"
+
+def _prepare_opps_frame(items: List[Dict]) -> pd.DataFrame:
+    """Turn raw Cosmos documents into the processed, flattened dashboard frame"""
+    df = pd.DataFrame(items)
+    if df.empty:
+        return df
+
+    # Enhanced data processing with ChatGPT's fixes
+    df = process_dataframe(df)
+
+    # Flatten nested fields into plain columns once, at load time
+    df = flatten_nested(df)
+
+    # Precompute search text once so in-page search is a vectorized lookup
+    df["searchText"] = build_search_text(df)
+
+    return compact_dataframe(df)
+
+def _missing_composite_index(e: CosmosHttpResponseError) -> bool:
+    """True for the 400 Cosmos returns when an ORDER BY has no composite index"""
+    return e.status_code == 400 and "composite index" in str(e).lower()
+
+def _sort_rank(value, opp_id: str) -> tuple:
+    """Python sort key matching build_order_by: Cosmos type order (null < number < string), value, id"""
+    if value is None:
+        return (0, 0, opp_id)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value, opp_id)
+    return (2, str(value), opp_id)
+
+def _query_sorted_locally(
+    start: datetime, end: datetime, flt: Dict, view: str, sort_by: str, ascending: bool,
+    after: tuple | None = None, limit: int | None = None,
+) -> List[Dict]:
+    """
+    Fallback for a missing composite index: read every matching document
+    unordered and apply build_order_by / build_keyset in Python. Costs a full
+    scan of the filtered range per call, so run indexing_policy.py apply.
+    """
+    logger.warning("No composite index for ORDER BY %s; sorting locally - run indexing_policy.py apply", sort_by)
+    q, p = build_query(start, end, flt, view=view)
+    container = cosmos_containers()["opps"]
+    with track("opps_unindexed_sort", container, filters=_filter_summary(flt), sort=sort_by) as call:
+        pager = container.query_items(
+            q, parameters=p, enable_cross_partition_query=True, response_hook=call.hook,
+        ).by_page()
+        items = [item for page in call.pages(pager) for item in page]
+    path = SORT_PATHS[sort_by]
+    rank = lambda d: _sort_rank(d.get(path), d["id"])
+    ordered = sorted(items, key=rank, reverse=not ascending)
+    if after is not None:
+        cursor = _sort_rank(*after)
+        ordered = [d for d in ordered if (rank(d) > cursor if ascending else rank(d) < cursor)]
+    return ordered[:limit] if limit is not None else ordered
+
+def _query_opps_page(
+    start: datetime, end: datetime, flt: Dict, after: tuple | None, page_size: int,
+    sort_by: str = DEFAULT_SORT, ascending: bool = False,
+) -> tuple[pd.DataFrame, tuple | None]:
+    """
+    Run one keyset-paged query; errors propagate so they are never cached.
+    Each page is a fresh TOP query resuming after the previous page's last
+    (sort value, id), so rows are never skipped or repeated - a Cosmos
+    continuation token is not reliable for cross-partition ORDER BY.
+    """
+    # One extra row tells whether another page follows without a further query
+    q, p = build_query(start, end, flt, sort_by=sort_by, ascending=ascending, top=page_size + 1, after=after)
+    container = cosmos_containers()["opps"]
     try:
-        items = cosmos_containers()["opps"].query_items(
-            q, parameters=p, enable_cross_partition_query=True
-        )
-        df = pd.DataFrame(list(items))
-        if df.empty:
-            return df
+        with track("opps_page", container, filters=_filter_summary(flt), sort=sort_by, continued=after is not None) as call:
+            pager = container.query_items(
+                q, parameters=p, enable_cross_partition_query=True, max_item_count=page_size + 1,
+                response_hook=call.hook,
+            ).by_page()
+            items = [item for page in call.pages(pager) for item in page]
+    except CosmosHttpResponseError as e:
+        if not _missing_composite_index(e):
+            raise
+        items = _query_sorted_locally(start, end, flt, "list", sort_by, ascending, after, page_size + 1)
 
-        # Enhanced data processing with ChatGPT's fixes
-        df = process_dataframe(df)
+    next_after = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_after = (items[-1].get(SORT_PATHS[sort_by]), items[-1]["id"])
+    return _prepare_opps_frame(items), next_after
 
-        # Flatten nested bits with better error handling
-        df["agency"] = df["govEntity"].apply(
-            lambda g: g.get("title") if isinstance(g, dict) else None
-        )
-        df["naicsCode"] = df["primaryNAICS"].apply(
-            lambda n: n.get("id") if isinstance(n, dict) else None
-        )
-        df["naicsTitle"] = df["primaryNAICS"].apply(
-            lambda n: n.get("title") if isinstance(n, dict) else None
-        )
+def stream_opps(
+    start: datetime,
+    end: datetime,
+    flt: Dict,
+    page_size: int = PAGE_SIZE,
+    view: str = "list",
+    sort_by: str | None = None,
+    ascending: bool = False,
+    top: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield each Cosmos page of the full result set (or its first *top* rows
+    in *sort_by* order) as a processed frame as soon as it arrives, so
+    callers can render (or export) before the query finishes. Without the
+    sort's composite index the rows come unsorted. Not cached; errors
+    propagate to the caller.
+    """
+    q, p = build_query(start, end, flt, view=view, sort_by=sort_by, ascending=ascending, top=top)
+    container = cosmos_containers()["opps"]
+    streamed = False
+    try:
+        with track("opps_stream", container, filters=_filter_summary(flt), view=view, sort=sort_by, top=top) as call:
+            pager = container.query_items(
+                q, parameters=p, enable_cross_partition_query=True, max_item_count=page_size,
+                response_hook=call.hook,
+            ).by_page()
+            for page in call.pages(pager):
+                if page:
+                    streamed = True
+                    yield _prepare_opps_frame(page)
+    except CosmosHttpResponseError as e:
+        if streamed or not sort_by or not _missing_composite_index(e):
+            raise
+        # Sorting the whole set here would hold it in memory; stream it unsorted instead
+        logger.warning("No composite index for %s; streaming results unsorted", sort_by)
+        yield from stream_opps(start, end, flt, page_size, view, top=top)
 
-        return df
+# ─── Result cache ─────────────────────────────────────────────────────────────
+RESULT_CACHE_TTL = 120  # seconds
+FILTER_KEYS = ("src", "naics", "psc", "status", "procurement")
+
+def normalize_filters(flt: Dict) -> tuple:
+    """Order- and alias-insensitive, hashable form of a filter dict"""
+    return tuple(
+        (key, tuple(sorted({normalize_source(v) if key == "src" else v for v in flt.get(key) or []})))
+        for key in FILTER_KEYS
+    )
+
+def _denormalize_filters(filters_key: tuple) -> Dict:
+    return {key: list(values) for key, values in filters_key}
+
+@cached("opps", ttl=RESULT_CACHE_TTL)
+def _cached_opps(start_iso: str, end_iso: str, filters_key: tuple) -> pd.DataFrame:
+    q, p = build_query(
+        datetime.fromisoformat(start_iso), datetime.fromisoformat(end_iso), _denormalize_filters(filters_key)
+    )
+    container = cosmos_containers()["opps"]
+    with track("opps_all", container, filters=_filter_summary(_denormalize_filters(filters_key))) as call:
+        pager = container.query_items(
+            q, parameters=p, enable_cross_partition_query=True, response_hook=call.hook
+        ).by_page()
+        items = [item for page in call.pages(pager) for item in page]
+    return _prepare_opps_frame(items)
+
+@cached("opps_page", ttl=RESULT_CACHE_TTL)
+def _cached_opps_page(
+    start_iso: str, end_iso: str, filters_key: tuple, after: tuple | None, page_size: int,
+    sort_by: str, ascending: bool,
+) -> tuple[pd.DataFrame, tuple | None]:
+    return _query_opps_page(
+        datetime.fromisoformat(start_iso), datetime.fromisoformat(end_iso),
+        _denormalize_filters(filters_key), after, page_size, sort_by, ascending,
+    )
+
+def _query_summary(start: datetime, end: datetime, flt: Dict) -> Dict:
+    """Run the aggregate queries concurrently; errors propagate so they are never cached"""
+    container = cosmos_containers()["opps"]
+
+    def _scalar(name, query, params):
+        with track(f"opps_{name}", container, filters=_filter_summary(flt)) as call:
+            values = [v for page in call.pages(container.query_items(
+                query, parameters=params, enable_cross_partition_query=True, response_hook=call.hook
+            ).by_page()) for v in page]
+        # Cross-partition aggregates may come back as one partial value per partition
+        return sum(v for v in values if isinstance(v, (int, float)))
+
+    queries = build_aggregate_queries(start, end, flt)
+    # Workers share the caller's script context so diagnostics reach its session
+    with ThreadPoolExecutor(
+        max_workers=len(queries), initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())
+    ) as pool:
+        futures = {name: pool.submit(_scalar, name, q, p) for name, (q, p) in queries.items()}
+        summary = {name: future.result() for name, future in futures.items()}
+    summary["avg_value"] = summary["total_value"] / summary["count"] if summary["count"] else 0.0
+    return summary
+
+@cached("summary", ttl=RESULT_CACHE_TTL)
+def _cached_summary(start_iso: str, end_iso: str, filters_key: tuple) -> Dict:
+    return _query_summary(
+        datetime.fromisoformat(start_iso), datetime.fromisoformat(end_iso), _denormalize_filters(filters_key)
+    )
+
+def invalidate_opps_cache():
+    """Drop cached query results for every session and replica, e.g. after a feedback write"""
+    _cached_opps.clear()
+    _cached_opps_page.clear()
+
+def invalidate_after_ingest():
+    """New documents change every result set, its aggregates and the filter values"""
+    invalidate_opps_cache()
+    _cached_summary.clear()
+    get_filter_options.clear()
+
+def _query_opps_delta(start: datetime, end: datetime, flt: Dict, since_ts: int) -> pd.DataFrame:
+    q, p = build_query(start, end, flt, since_ts=since_ts)
+    container = cosmos_containers()["opps"]
+    with track("opps_delta", container, filters=_filter_summary(flt), since=since_ts) as call:
+        pager = container.query_items(
+            q, parameters=p, enable_cross_partition_query=True, response_hook=call.hook
+        ).by_page()
+        items = [item for page in call.pages(pager) for item in page]
+    return _prepare_opps_frame(items)
+
+def fetch_opps(start: datetime, end: datetime, flt: Dict, since_ts: int | None = None) -> pd.DataFrame:
+    """
+    Every opportunity matching the filters. In delta mode (*since_ts* set to
+    the newest ``_ts`` already loaded) only documents written since then are
+    fetched, uncached, for merge_delta.
+    """
+    try:
+        if since_ts is not None:
+            return _query_opps_delta(start, end, flt, since_ts)
+        return _cached_opps(start.isoformat(), end.isoformat(), normalize_filters(flt))
         
     except Exception as e:
         st.error(f"Error fetching opportunities: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+def fetch_opps_page(
+    start: datetime,
+    end: datetime,
+    flt: Dict,
+    after: tuple | None = None,
+    page_size: int = PAGE_SIZE,
+    sort_by: str = DEFAULT_SORT,
+    ascending: bool = False,
+) -> tuple[pd.DataFrame, tuple | None]:
+    """
+    Fetch one page of opportunities, in *sort_by* order, resuming after the keyset cursor *after*.
+    Returns (page dataframe, cursor for the next page or None when exhausted).
+    Pages are cached across sessions and replicas (see cache_backend.py), keyed by the normalized filters and sort.
+    """
+    try:
+        return _cached_opps_page(
+            start.isoformat(), end.isoformat(), normalize_filters(flt), after, page_size,
+            sort_by, ascending,
+        )
+
+    except Exception as e:
+        st.error(f"Error fetching opportunities: {e}")
+        return pd.DataFrame(), None
+
+def fetch_summary(start: datetime, end: datetime, flt: Dict, refresh: bool = False) -> Dict | None:
+    """
+    Exact {"count", "total_value", "avg_value"} for the whole result set,
+    computed server-side, or None if the aggregates fail. *refresh* skips
+    the cached value.
+    """
+    key = (start.isoformat(), end.isoformat(), normalize_filters(flt))
+    try:
+        if refresh:
+            _cached_summary.clear(*key)
+        return _cached_summary(*key)
+    except Exception as e:
+        st.warning(f"Could not load summary metrics: {e}")
+        return None
+
+def fetch_first_page(
+    start: datetime, end: datetime, flt: Dict, sort_by: str = DEFAULT_SORT, ascending: bool = False
+) -> tuple[pd.DataFrame, tuple | None, Dict | None]:
+    """First page and the exact summary, with the aggregates running alongside the page query"""
+    key = (start.isoformat(), end.isoformat(), normalize_filters(flt))
+    # The worker shares this session's script context for cosmos_containers()
+    with ThreadPoolExecutor(max_workers=1, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as pool:
+        summary = pool.submit(_cached_summary, *key)
+        df, token = fetch_opps_page(start, end, flt, sort_by=sort_by, ascending=ascending)
+        try:
+            return df, token, summary.result()
+        except Exception as e:
+            st.warning(f"Could not load summary metrics: {e}")
+            return df, token, None
+
+# ─── Ingest run signal ────────────────────────────────────────────────────────
+INGEST_RUN_DOC = "run:latest"  # written by govwin-ingest pull_daily when a run finishes
+
+def latest_ingest_run() -> Dict | None:
+    """The ingest run-complete document, or None before the first run"""
+    container = cosmos_containers()["state"]
+    try:
+        with track("ingest_run", container) as call:
+            doc = container.read_item(item=INGEST_RUN_DOC, partition_key=INGEST_RUN_DOC, response_hook=call.hook)
+            call.response()
+        return doc
+    except CosmosResourceNotFoundError:
+        return None
+
+# ─── Live updates (change feed) ───────────────────────────────────────────────
+LIVE_POLL_SECONDS = 60
+
+def matches_filters(doc: Dict, start: datetime, end: datetime, flt: Dict) -> bool:
+    """In-memory equivalent of build_where for one raw document"""
+    epoch = doc.get("ingestedAtEpoch")
+    if not isinstance(epoch, (int, float)):
+        try:
+            epoch = _epoch(datetime.fromisoformat(str(doc.get("ingestedAt"))))
+        except ValueError:
+            return False
+    if not _epoch(start) <= epoch <= _epoch(end):
+        return False
+
+    naics_ids = doc.get("naicsIds")
+    if naics_ids is None:
+        naics_ids = [n.get("id") for n in doc.get("allNAICSCodes") or [] if isinstance(n, dict)]
+    relevance = []
+    if flt["naics"]:
+        relevance.append(bool(set(flt["naics"]) & set(naics_ids)))
+    if flt["psc"]:
+        relevance.append(doc.get("pscCode") in flt["psc"])
+    if relevance and not any(relevance):
+        return False
+
+    if flt["src"] and doc.get("source") not in {normalize_source(s) for s in flt["src"]}:
+        return False
+    if flt["status"] and doc.get("status") not in flt["status"]:
+        return False
+    if flt["procurement"] and doc.get("procurement") not in flt["procurement"]:
+        return False
+    return True
+
+def poll_changes(continuation: str | None, since_ts: int | None = None) -> tuple[List[Dict], str | None]:
+    """
+    Documents written since *continuation* (or, on the first poll, since
+    *since_ts* / now) and the continuation for the next poll.
+    """
+    container = cosmos_containers()["opps"]
+    with track("live_poll", container, resumed=bool(continuation)) as call:
+        if continuation:
+            feed = container.query_items_change_feed(continuation=continuation, response_hook=call.hook)
+        else:
+            start_time = datetime.fromtimestamp(since_ts, timezone.utc) if since_ts else "Now"
+            feed = container.query_items_change_feed(start_time=start_time, response_hook=call.hook)
+        pager = feed.by_page()
+        docs = [doc for page in call.pages(pager) for doc in page]
+    return docs, pager.continuation_token or continuation
+
+def apply_live_changes(
+    df: pd.DataFrame, docs: List[Dict], start: datetime, end: datetime, flt: Dict
+) -> tuple[pd.DataFrame, int, int, int]:
+    """
+    Merge changed documents that match the active filters into the session
+    frame, and drop loaded rows whose change means they no longer match.
+    Returns (frame, added, updated, removed).
+    """
+    matching, gone = [], set()
+    for d in docs:
+        if matches_filters(d, start, end, flt):
+            matching.append(d)
+        else:
+            gone.add(d["id"])
+    removed = 0
+    if gone and not df.empty:
+        dropped = df["id"].isin(gone)
+        removed = int(dropped.sum())
+        if removed:
+            df = df[~dropped].reset_index(drop=True)
+    df, added, updated = merge_delta(df, _prepare_opps_frame(matching))
+    return df, added, updated, removed
+
+# ─── Lazy card details ────────────────────────────────────────────────────────
+DETAIL_CACHE_SIZE = 512   # most recently read opportunities kept
+DETAIL_CACHE_TTL = 900    # seconds
+
+def _read_opp(op: str, opp_id: str, container=None) -> Dict:
+    """Tracked point read of one opportunity (id is the partition key)"""
+    container = container or cosmos_containers()["opps"]
+    with track(op, container, id=opp_id) as call:
+        doc = container.read_item(item=opp_id, partition_key=opp_id, response_hook=call.hook)
+        call.response()
+    return doc
+
+@cached("detail", ttl=DETAIL_CACHE_TTL, max_entries=DETAIL_CACHE_SIZE)
+def get_opportunity_detail(opp_id: str) -> pd.Series | None:
+    """Full, processed opportunity via a point read (id is the partition key)"""
+    try:
+        doc = _read_opp("detail", opp_id)
+    except CosmosResourceNotFoundError:
+        return None
+    return _prepare_opps_frame([doc]).iloc[0]
+
+def load_detail(row: pd.Series) -> pd.Series:
+    """The list row's full detail, keeping the session's (possibly newer) feedback values and etag"""
+    detail = get_opportunity_detail(str(row["id"]))
+    if detail is None:
+        return row
+    detail = detail.copy()
+    for col in ("relevant", "pursued", "_etag"):
+        detail[col] = row.get(col)
+    return detail
+
+def refresh_opportunity(opp_id: str) -> Dict | None:
+    """Uncached point read of one opportunity; also drops its cached detail"""
+    get_opportunity_detail.clear(opp_id)
+    try:
+        return _read_opp("refresh", opp_id)
+    except CosmosResourceNotFoundError:
+        return None
+
+# ─── Full-history keyword search ──────────────────────────────────────────────
+SEARCH_INDEX_PATH = os.getenv("GOVWIN_SEARCH_INDEX", "govwin_search.db")
+SEARCH_SYNC_INTERVAL = 300  # seconds between change-feed pulls per process
+
+@st.cache_resource(show_spinner=False)
+def search_index():
+    # Imported here: search_index reuses this module's tokenizer regexes
+    from search_index import SearchIndex
+    return SearchIndex(SEARCH_INDEX_PATH)
+
+@st.cache_data(ttl=SEARCH_SYNC_INTERVAL, show_spinner=False)
+def _sync_search_index() -> int:
+    """Throttled incremental sync - at most one change-feed pull per interval"""
+    container = cosmos_containers()["opps"]
+    with track("search_sync", container) as call:
+        synced = search_index().sync(container, response_hook=call.hook)
+        call.response(synced)
+    return synced
+
+def _build_search_index():
+    try:
+        logger.info("Search index built with %d opportunities", _sync_search_index())
+    except Exception as e:
+        logger.warning("Search index build failed: %s", e)
+        start_search_index_build.clear()  # the next search retries
+
+@st.cache_resource(show_spinner=False)
+def start_search_index_build() -> threading.Thread | None:
+    """
+    Run the initial sync (the whole change feed from the beginning) on a
+    daemon thread, once per process, so no visitor waits for it.
+    """
+    if search_index().ready:
+        return None
+    thread = threading.Thread(target=_build_search_index, name="search-index", daemon=True)
+    thread.start()
+    return thread
+
+def read_opps(ids: List[str]) -> List[Dict]:
+    """Point-read opportunities by id (the partition key), preserving order"""
+    container = cosmos_containers()["opps"]
+
+    def _read(opp_id):
+        try:
+            return _read_opp("history_read", opp_id, container)
+        except CosmosResourceNotFoundError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as pool:
+        docs = list(pool.map(_read, ids))
+    return [d for d in docs if d is not None]
+
+def search_history(query: str, limit: int = 50, loaded: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Ranked keyword search across all ingested opportunities, not just the
+    loaded window. Until the index's first build finishes, the *loaded*
+    results are searched with search_mask instead.
+    """
+    try:
+        if not search_index().ready:
+            start_search_index_build()
+            st.info("The full-history index is still being built; showing matches in the loaded results for now.")
+            if loaded is None or loaded.empty:
+                return pd.DataFrame()
+            return loaded[search_mask(loaded, query)].reset_index(drop=True)
+
+        _sync_search_index()
+        hits = search_index().search(query, limit)
+        if not hits:
+            return pd.DataFrame()
+        df = _prepare_opps_frame(read_opps([opp_id for opp_id, _ in hits]))
+        if not df.empty:
+            ranks = {opp_id: rank for rank, (opp_id, _) in enumerate(hits)}
+            df["searchRank"] = df["id"].map(ranks)
+            df = df.sort_values("searchRank").reset_index(drop=True)
+        return df
+
+    except Exception as e:
+        st.error(f"Error searching opportunities: {e}")
+        return pd.DataFrame()
@@ -0,0 +1,47 @@
+"""
+Parker Tide landing-page defaults, shared by app.py and the prewarmer so
+both build exactly the same query (and therefore the same cache keys).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+from data_access import merge_with_preferred
+
+# Complete NAICS and PSC codes relevant to Parker Tide's services
+# Based on pt_naics_psc.docx - includes consulting, technical, administrative services
+PARKER_TIDE_NAICS = [
+    "518210", "541199", "541211", "541214", "541219", "541330", "541519",
+    "541611", "541612", "541618", "541690", "541720", "541930", "541990",
+    "561110", "561311", "561312", "561320", "561410", "561421", "561431",
+    "561499", "561611", "611430"
+]
+
+PARKER_TIDE_PSC = [
+    "R406", "R408", "R418", "R499", "R607", "R699", "R707"
+]
+
+DEFAULT_LOOKBACK_DAYS = 1  # landing page shows yesterday and today
+
+def available_defaults(filter_options: Dict) -> tuple[list, list]:
+    """Parker Tide NAICS and PSC codes that actually occur in the data"""
+    naics_options = merge_with_preferred(filter_options.get("combined_naics", []), PARKER_TIDE_NAICS)
+    psc_options = merge_with_preferred(filter_options.get("psc", []), PARKER_TIDE_PSC)
+    return (
+        [code for code in PARKER_TIDE_NAICS if code in naics_options],
+        [code for code in PARKER_TIDE_PSC if code in psc_options],
+    )
+
+def default_window(now: datetime | None = None) -> tuple[datetime, datetime]:
+    """The sidebar's default From/To dates as a datetime range"""
+    today = (now or datetime.utcnow()).date()
+    return (
+        datetime.combine(today - timedelta(days=DEFAULT_LOOKBACK_DAYS), datetime.min.time()),
+        datetime.combine(today, datetime.max.time()),
+    )
+
+def default_query(filter_options: Dict, now: datetime | None = None) -> tuple[datetime, datetime, Dict]:
+    """(start, end, filters) of the landing page before the user touches anything"""
+    naics, psc = available_defaults(filter_options)
+    start, end = default_window(now)
+    return start, end, {"src": [], "naics": naics, "psc": psc, "status": [], "procurement": []}
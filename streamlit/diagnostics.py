@@ -0,0 +1,142 @@
+"""
+Cosmos call diagnostics for the dashboard.
+
+Every Cosmos request made by data_access and cards runs inside ``track``,
+which records request charge (RU), server latency, client wall time, backend
+request, page and item counts. Charges come from the call's own
+``response_hook``, which the SDK invokes with the headers of every backend
+request, so cross-partition (ORDER BY / aggregate) pipelines and concurrent
+calls on one client are each attributed correctly. Each call is logged as a
+one-line JSON ``cosmos_call`` event and, when made on behalf of a session,
+kept in that session's history (``st.session_state``) for app.py's
+diagnostics panel, so one user's filters and ids never show up in another's.
+Worker threads must carry the session's script context to be recorded;
+calls from sessionless threads (e.g. the prewarmer) are only logged.
+
+Cache hits never reach Cosmos, so they are never recorded.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Mapping
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger("govwin.diagnostics")
+
+HISTORY_SIZE = 200  # most recent calls kept for the panel, per session
+SESSION_KEY = "cosmos_calls"
+
+@dataclass
+class CallStats:
+    op: str
+    container: str | None = None
+    ru: float = 0.0
+    server_ms: float = 0.0
+    client_ms: float = 0.0
+    requests: int = 0
+    pages: int = 0
+    items: int = 0
+    error: str | None = None
+    at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    detail: Dict = field(default_factory=dict)
+
+class _Call:
+    """
+    Handle yielded by ``track``. Pass ``hook`` as the SDK call's
+    ``response_hook=``; record results with ``pages`` (queries) or
+    ``response`` (point operations).
+    """
+
+    def __init__(self, stats: CallStats):
+        self.stats = stats
+
+    def hook(self, headers: Mapping, result):
+        """response_hook: add the charge of one backend request"""
+        # query_items also calls the hook once up front with the client's
+        # shared (stale) headers and the lazy pager as result - skip that one
+        if not isinstance(result, Mapping):
+            return
+        self.stats.ru += float(headers.get("x-ms-request-charge", 0) or 0)
+        self.stats.server_ms += float(headers.get("x-ms-request-duration-ms", 0) or 0)
+        self.stats.requests += 1
+
+    def response(self, items: int = 1):
+        """Account for one Cosmos response (a query page or a point operation)"""
+        self.stats.pages += 1
+        self.stats.items += items
+
+    def pages(self, pager) -> Iterable[list]:
+        """Iterate a ``by_page()`` pager, recording every page"""
+        for page in pager:
+            page = list(page)
+            self.response(len(page))
+            yield page
+
+_lock = threading.Lock()
+
+def _session_history() -> deque | None:
+    """The current session's call history, or None outside any session"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    with _lock:
+        return st.session_state.setdefault(SESSION_KEY, deque(maxlen=HISTORY_SIZE))
+
+@contextmanager
+def track(op: str, container, **detail):
+    """Time and record one logical Cosmos call (which may span several pages)"""
+    stats = CallStats(op=op, container=getattr(container, "id", None), detail=detail)
+    started = time.perf_counter()
+    try:
+        yield _Call(stats)
+    except Exception as e:
+        stats.error = type(e).__name__
+        raise
+    finally:
+        stats.client_ms = round((time.perf_counter() - started) * 1000, 1)
+        stats.ru = round(stats.ru, 2)
+        history = _session_history()
+        if history is not None:
+            history.append(stats)
+        logger.info(json.dumps({"event": "cosmos_call", **asdict(stats)}, default=str))
+
+def recent(limit: int | None = None) -> List[CallStats]:
+    """This session's recorded calls, newest first"""
+    history = _session_history()
+    calls = list(reversed(history)) if history is not None else []
+    return calls[:limit] if limit else calls
+
+def clear():
+    history = _session_history()
+    if history is not None:
+        history.clear()
+
+def history_frame(limit: int | None = None) -> pd.DataFrame:
+    """Recent calls as a table for the diagnostics panel"""
+    calls = recent(limit)
+    if not calls:
+        return pd.DataFrame()
+    df = pd.DataFrame([asdict(c) for c in calls])
+    df["detail"] = df["detail"].apply(lambda d: ", ".join(f"{k}={v}" for k, v in d.items()))
+    return df[["at", "op", "container", "ru", "server_ms", "client_ms", "requests", "pages", "items", "error", "detail"]].round(1)
+
+def summary_by_op() -> pd.DataFrame:
+    """Call count and mean / total cost per operation, most expensive first"""
+    df = history_frame()
+    if df.empty:
+        return df
+    return (
+        df.groupby("op")
+        .agg(calls=("op", "size"), total_ru=("ru", "sum"), avg_ru=("ru", "mean"),
+             avg_client_ms=("client_ms", "mean"), items=("items", "sum"))
+        .sort_values("total_ru", ascending=False)
+        .round(1)
+    )
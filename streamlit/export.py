@@ -0,0 +1,157 @@
+"""
+Streaming export of filtered opportunities to CSV or Parquet.
+
+Pages come straight off the Cosmos pager (data_access.stream_opps), are
+flattened like the dashboard frame and appended to the output file one
+page at a time, so memory stays at roughly one page whatever the size of
+the result set.
+
+Usage:
+    python export.py opps.csv --days 30
+    python export.py opps.parquet --days 90 --naics 541611 --naics 541330 --src SAM.gov
+    python export.py top.csv --days 90 --sort contractValue --top 100
+"""
+
+import os
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_access import SORT_PATHS, stream_opps
+
+EXPORT_PAGE_SIZE = 500
+# The dashboard hands the finished file to st.download_button, which holds it
+# in memory, so in-app exports stop here; use this script for larger ones
+APP_EXPORT_MAX_ROWS = 20_000
+
+# Flat columns written to every export, in order
+EXPORT_FIELDS = [
+    "id", "title", "source", "status", "procurement", "agency",
+    "contractValue", "postedDate", "updateDate", "ingestedAt", "responseDate",
+    "solicitationDate", "solicitationDateEstimated", "awardDate", "awardDateEstimated", "naicsCode", "naicsTitle", "allNaicsIds",
+    "pscCode", "classificationCodeDesc", "solicitationNumber", "typeOfAward",
+    "setAsideTitles", "competitionTitles", "contractTypeTitles",
+    "primaryTags", "secondaryTags", "sourceURL", "relevant", "pursued", "description",
+]
+# GovWin date objects, e.g. {"value": "2025-10-21T00:00:00.000", "deltekEstimate": "true", "govtEstimate": "false"}
+DATE_OBJECT_FIELDS = ["responseDate", "solicitationDate", "awardDate"]
+DATE_FIELDS = ["postedDate", "updateDate", "ingestedAt", *DATE_OBJECT_FIELDS]
+ESTIMATE_FIELDS = {f"{col}Estimated": col for col in ("solicitationDate", "awardDate")}
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Fixed schema so every Parquet row group matches, whatever a page contains
+def _parquet_type(col: str) -> pa.DataType:
+    if col == "contractValue":
+        return pa.float64()
+    if col in DATE_FIELDS:
+        return pa.timestamp("ns")
+    if col in ESTIMATE_FIELDS:
+        return pa.bool_()
+    return pa.string()
+
+PARQUET_SCHEMA = pa.schema([(col, _parquet_type(col)) for col in EXPORT_FIELDS])
+
+def _date_value(v):
+    """The ISO string inside a GovWin date object (plain values pass through)"""
+    return v.get("value") if isinstance(v, dict) else v
+
+def _is_estimate(v):
+    """True if Deltek or the government flagged the date as an estimate; None when unknown"""
+    if not isinstance(v, dict) or not ({"deltekEstimate", "govtEstimate"} & v.keys()):
+        return None
+    return any(str(v.get(k, "")).lower() == "true" for k in ("deltekEstimate", "govtEstimate"))
+
+def export_frame(page: pd.DataFrame) -> pd.DataFrame:
+    """Project a processed page onto EXPORT_FIELDS with stable column types"""
+    out = page.reindex(columns=EXPORT_FIELDS)
+    for flag, col in ESTIMATE_FIELDS.items():
+        source = page[col] if col in page else pd.Series(None, index=page.index, dtype="object")
+        out[flag] = source.map(_is_estimate).astype("boolean")
+    for col in EXPORT_FIELDS:
+        if col == "contractValue":
+            out[col] = pd.to_numeric(out[col], errors="coerce")
+        elif col in DATE_FIELDS:
+            values = out[col].astype("object").map(_date_value)
+            out[col] = pd.to_datetime(values, errors="coerce", utc=True).dt.tz_localize(None)
+        elif col in ESTIMATE_FIELDS:
+            continue
+        else:
+            values = out[col].astype("object")
+            out[col] = values.where(values.notna(), None).map(lambda v: v if v is None else str(v))
+    return out
+
+def write_export(
+    pages: Iterable[pd.DataFrame],
+    path: str,
+    fmt: str,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """Append each page to *path* as it arrives; returns the number of rows written"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    rows = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            export_frame(pd.DataFrame()).to_csv(f, index=False)
+            for page in pages:
+                chunk = export_frame(page)
+                chunk.to_csv(f, index=False, header=False)
+                rows += len(chunk)
+                if progress:
+                    progress(rows)
+    else:
+        with pq.ParquetWriter(path, PARQUET_SCHEMA) as writer:
+            for page in pages:
+                chunk = export_frame(page)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=PARQUET_SCHEMA, preserve_index=False))
+                rows += len(chunk)
+                if progress:
+                    progress(rows)
+    return rows
+
+def export_opps(
+    start: datetime,
+    end: datetime,
+    flt: Dict,
+    path: str,
+    fmt: str,
+    progress: Callable[[int], None] | None = None,
+    sort: tuple[str, bool] | None = None,
+    top: int | None = None,
+) -> int:
+    """
+    Stream every opportunity matching the dashboard filters into *path*, in
+    server-side (sort_by, ascending) order and capped at *top* rows if given
+    """
+    sort_by, ascending = sort or (None, False)
+    pages = stream_opps(start, end, flt, page_size=EXPORT_PAGE_SIZE, view="detail",
+                        sort_by=sort_by, ascending=ascending, top=top)
+    return write_export(pages, path, fmt, progress)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export filtered opportunities")
+    parser.add_argument("path", help="output file; the extension picks the format (.csv or .parquet)")
+    parser.add_argument("--days", type=int, default=30, help="ingested within the last N days")
+    for flag, key in (("--naics", "naics"), ("--psc", "psc"), ("--src", "src"),
+                      ("--status", "status"), ("--procurement", "procurement")):
+        parser.add_argument(flag, dest=key, action="append", default=[], help=f"{key} filter value (repeatable)")
+    parser.add_argument("--sort", choices=list(SORT_PATHS), help="order rows server-side by this field")
+    parser.add_argument("--ascending", action="store_true", help="with --sort: smallest / oldest first")
+    parser.add_argument("--top", type=int, help="only the first N rows (in --sort order)")
+    args = parser.parse_args()
+
+    fmt = os.path.splitext(args.path)[1].lstrip(".").lower()
+    end = datetime.utcnow()
+    flt = {k: getattr(args, k) for k in ("src", "naics", "psc", "status", "procurement")}
+    sort = (args.sort, args.ascending) if args.sort else None
+    written = export_opps(end - timedelta(days=args.days), end, flt, args.path, fmt, sort=sort, top=args.top)
+    print(f"Exported {written:,} opportunities to {args.path}")
@@ -0,0 +1,108 @@
+"""
+Background prewarming of the landing page.
+
+One daemon thread per Streamlit process makes sure the filter options and
+the default Parker Tide view (first page + summary) are in the result
+cache, so the first visitor after a change does not pay for the cold
+queries. It warms only at these moments:
+
+- when the process starts, and when the default date window rolls over at
+  midnight UTC - filling entries that are missing, never recomputing ones
+  another replica already cached
+- when the ingest run-complete document (ingest_state/run:latest, one point
+  read per poll) shows a new finished run - invalidating the query caches
+  and warming them again
+
+Each job is claimed with cache_backend.try_lock, so with a shared cache
+(sqlite / Redis) only one replica runs it; the others keep using the
+entries it fills. Nothing is rewarmed on a timer, so an idle app only pays
+for the run-signal reads.
+
+Environment:
+    PREWARM_ENABLED=0            turn the refresher off
+    PREWARM_POLL_SECONDS=60      how often to check the run signal and date
+"""
+
+import os
+import time
+import logging
+import threading
+
+import streamlit as st
+
+from cache_backend import try_lock
+from data_access import (
+    RESULT_CACHE_TTL,
+    fetch_first_page,
+    get_filter_options,
+    invalidate_after_ingest,
+    latest_ingest_run,
+)
+from defaults import default_query, default_window
+
+logger = logging.getLogger("govwin.prewarm")
+
+INGEST_LOCK_TTL = 24 * 3600  # one replica refreshes after each run
+
+class Prewarmer:
+    def __init__(self, poll_seconds: int):
+        self.poll_seconds = poll_seconds
+        self.last_run: str | None = None
+        self._checked = False
+        self.window = None               # default window last filled
+        self._stop = threading.Event()
+
+    def fill(self):
+        """Compute the landing-page entries that are not cached yet (hits cost no query)"""
+        started = time.perf_counter()
+        options = get_filter_options()
+        start, end, flt = default_query(options)
+        df, _, summary = fetch_first_page(start, end, flt)
+        logger.info(
+            "Prewarmed default view (%d rows, summary=%s) in %.0f ms",
+            len(df), bool(summary), (time.perf_counter() - started) * 1000,
+        )
+
+    def check_ingest(self) -> bool:
+        """True when a new ingest run has completed since the last check"""
+        doc = latest_ingest_run()
+        completed = doc.get("completedAt") if doc else None
+        is_new = self._checked and completed != self.last_run
+        self.last_run, self._checked = completed, True
+        return is_new
+
+    def poll(self):
+        """One iteration of the loop: react to a new ingest run or a new default window"""
+        if self.check_ingest():
+            if try_lock(f"prewarm:ingest:{self.last_run}", INGEST_LOCK_TTL):
+                logger.info("Ingest run %s completed; refreshing caches", self.last_run)
+                invalidate_after_ingest()
+                self.fill()
+            self.window = default_window()
+            return
+
+        window = default_window()
+        if window != self.window:
+            if try_lock(f"prewarm:fill:{window[0]:%Y-%m-%d}", RESULT_CACHE_TTL):
+                self.fill()
+            self.window = window
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning("Prewarm failed: %s", e)
+            self._stop.wait(self.poll_seconds)
+
+    def stop(self):
+        self._stop.set()
+
+@st.cache_resource(show_spinner=False)
+def start_prewarmer() -> Prewarmer | None:
+    """Start the refresher once per process (cache_resource makes it a singleton)"""
+    if os.getenv("PREWARM_ENABLED", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    prewarmer = Prewarmer(int(os.getenv("PREWARM_POLL_SECONDS", "60")))
+    threading.Thread(target=prewarmer.run, name="prewarm", daemon=True).start()
+    return prewarmer
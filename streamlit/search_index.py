@@ -0,0 +1,139 @@
+"""
+Local full-text index over opportunities (SQLite FTS5).
+
+The index is fed incrementally from the opportunities container's change
+feed, with the feed continuation stored alongside the index so each sync
+only pulls documents written since the last one. Searches return ranked
+opportunity ids; callers hydrate them with point reads.
+
+Usage:
+    python search_index.py sync
+    python search_index.py search "background investigation"
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from typing import Iterable, List, Tuple
+
+from text_utils import HTML_TAG, SEARCH_TERM
+
+class SearchIndex:
+    """FTS5 index of title, description text, agency and tags keyed by opportunity id"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS opps_fts USING fts5("
+                "id UNINDEXED, title, description, agency, tags, "
+                "tokenize='porter unicode61')"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    # ─── Writes ───────────────────────────────────────────────────────────────
+    @staticmethod
+    def _row(doc: dict) -> tuple:
+        agency = doc.get("govEntity", {}).get("title") if isinstance(doc.get("govEntity"), dict) else None
+        tags = [
+            t.get("name", "") for t in doc.get("smartTagObject") or [] if isinstance(t, dict)
+        ]
+        description = HTML_TAG.sub(" ", str(doc.get("description") or ""))
+        return (
+            str(doc["id"]),
+            doc.get("title") or "",
+            description,
+            agency or "",
+            " ".join(tags),
+        )
+
+    def upsert_many(self, docs: Iterable[dict]) -> int:
+        rows = [self._row(d) for d in docs if d.get("id")]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM opps_fts WHERE id = ?", [(r[0],) for r in rows])
+            self._conn.executemany(
+                "INSERT INTO opps_fts (id, title, description, agency, tags) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def _get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def sync(self, container, batch_size: int = 500, **kwargs) -> int:
+        """Pull changes since the saved continuation into the index (kwargs go to the SDK, e.g. response_hook)"""
+        continuation = self._get_meta("continuation")
+        if continuation:
+            feed = container.query_items_change_feed(continuation=continuation, max_item_count=batch_size, **kwargs)
+        else:
+            feed = container.query_items_change_feed(start_time="Beginning", max_item_count=batch_size, **kwargs)
+
+        # The pager's token is this feed's own, unlike the client-wide last_response_headers
+        pager = feed.by_page()
+        indexed = 0
+        for page in pager:
+            indexed += self.upsert_many(list(page))
+
+        token = pager.continuation_token
+        if token:
+            self._set_meta("continuation", token)
+        return indexed
+
+    @property
+    def ready(self) -> bool:
+        """True once a full sync has completed (an initial build saves its continuation last)"""
+        return self._get_meta("continuation") is not None
+
+    # ─── Reads ────────────────────────────────────────────────────────────────
+    @staticmethod
+    def to_match_query(query: str) -> str:
+        """Quote each term (and "phrase") so user input is never parsed as FTS syntax"""
+        terms = [(phrase or word).replace('"', "") for phrase, word in SEARCH_TERM.findall(query)]
+        return " ".join(f'"{t}"' for t in terms if t)
+
+    def search(self, query: str, limit: int = 50) -> List[Tuple[str, float]]:
+        """Ranked (id, bm25 score) pairs, best first; title and tags weigh most"""
+        match = self.to_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, bm25(opps_fts, 0.0, 10.0, 1.0, 3.0, 5.0) AS score "
+                "FROM opps_fts WHERE opps_fts MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM opps_fts").fetchone()[0]
+
+if __name__ == "__main__":
+    from azure.cosmos import CosmosClient
+
+    index = SearchIndex(os.getenv("GOVWIN_SEARCH_INDEX", "govwin_search.db"))
+    command = sys.argv[1] if len(sys.argv) > 1 else "sync"
+
+    if command == "sync":
+        client = CosmosClient(os.getenv("COSMOS_URL"), os.getenv("COSMOS_KEY"))
+        opps = client.get_database_client("govwin").get_container_client(os.getenv("OPPORTUNITIES_CONTAINER", "opportunities"))
+        print(f"Indexed {index.sync(opps)} changed opportunities ({index.count()} total)")
+    elif command == "search":
+        for opp_id, score in index.search(" ".join(sys.argv[2:])):
+            print(f"{score:8.3f}  {opp_id}")
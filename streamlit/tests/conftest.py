@@ -0,0 +1,148 @@
+import copy
+import os
+import sys
+import uuid
+
+import pytest
+import streamlit as st
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosHttpResponseError,
+    CosmosResourceNotFoundError,
+)
+
+# The dashboard modules are plain scripts in streamlit/, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_backend
+import cards
+import data_access
+
+EPOCH = 1749000000  # 2025-06-04, inside the tests' default window
+
+RESPONSE_HEADERS = {"x-ms-request-charge": "2.5", "x-ms-request-duration-ms": "1.0"}
+
+
+def opp(n: int, **fields) -> dict:
+    """A minimal stored opportunity; *fields* override or extend it"""
+    doc = {
+        "id": f"OPP{n:03d}", "title": f"Opportunity {n}", "source": "SAM.gov", "status": "Open",
+        "ingestedAt": "2025-06-04T00:00:00", "ingestedAtEpoch": EPOCH,
+        "naicsIds": ["541611"], "pscCode": "R408", "contractValue": float(n),
+        "_etag": f"etag-{n}", "_ts": EPOCH + n,
+    }
+    doc.update(fields)
+    return doc
+
+
+class FakePager:
+    """``by_page()`` result: pages of *size* items, one response_hook call per page"""
+
+    def __init__(self, items, size, hook):
+        self.items, self.size, self.hook = items, size or 1000, hook
+        self.continuation_token = None
+
+    def __iter__(self):
+        for start in range(0, len(self.items), self.size):
+            page = self.items[start:start + self.size]
+            if self.hook:
+                self.hook(RESPONSE_HEADERS, {"Documents": page})
+            yield iter(page)
+
+
+class FakeQuery(list):
+    def __init__(self, items, size=None, hook=None):
+        super().__init__(items)
+        self.size, self.hook = size, hook
+
+    def by_page(self, continuation=None):
+        return FakePager(list(self), self.size, self.hook)
+
+
+class FakeContainer:
+    """
+    In-memory stand-in for a Cosmos container. Queries return every stored
+    document unless *answer* (query, parameters) -> items is set; ORDER BY
+    queries fail like Cosmos without a composite index when *indexed* is off.
+    """
+
+    id = "opportunities"
+
+    def __init__(self, docs=()):
+        self.docs = {d["id"]: copy.deepcopy(d) for d in docs}
+        self.queries: list = []
+        self.answer = None
+        self.indexed = True
+        self.fail_ids: dict = {}          # id -> exception raised by patch_item / read_item
+
+    def query_items(self, query, parameters=None, max_item_count=None, response_hook=None, **kwargs):
+        self.queries.append((query, parameters))
+        if "ORDER BY" in query and not self.indexed:
+            raise CosmosHttpResponseError(
+                status_code=400,
+                message="The order by query does not have a corresponding composite index that it can be served from.",
+            )
+        items = self.answer(query, parameters) if self.answer else list(self.docs.values())
+        return FakeQuery(copy.deepcopy(items), max_item_count, response_hook)
+
+    def query_items_change_feed(self, continuation=None, start_time=None, max_item_count=None, **kwargs):
+        since = int(continuation) if continuation else 0
+        changed = [d for d in self.docs.values() if d["_ts"] > since]
+        result = FakeQuery(copy.deepcopy(changed), max_item_count)
+        pager = result.by_page()
+        pager.continuation_token = str(max([d["_ts"] for d in self.docs.values()] or [since]))
+        result.by_page = lambda continuation=None: pager
+        return result
+
+    def read_item(self, item, partition_key, response_hook=None, **kwargs):
+        if item in self.fail_ids:
+            raise self.fail_ids[item]
+        if item not in self.docs:
+            raise CosmosResourceNotFoundError(status_code=404, message="Not found")
+        if response_hook:
+            response_hook(RESPONSE_HEADERS, self.docs[item])
+        return copy.deepcopy(self.docs[item])
+
+    def patch_item(self, item, partition_key, patch_operations, if_match=None, response_hook=None, **kwargs):
+        if item in self.fail_ids:
+            raise self.fail_ids[item]
+        doc = self.docs.get(item)
+        if doc is None:
+            raise CosmosResourceNotFoundError(status_code=404, message="Not found")
+        if if_match and if_match != doc["_etag"]:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+        for op in patch_operations:
+            doc[op["path"].strip("/")] = op["value"]
+        doc["_etag"] = uuid.uuid4().hex
+        return copy.deepcopy(doc)
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    """A fresh in-process cache backend for every test"""
+    backend = cache_backend.MemoryBackend()
+    monkeypatch.setattr(cache_backend, "_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def container(monkeypatch):
+    """Empty FakeContainer served by cosmos_containers() (data_access and cards) for every container name"""
+    fake = FakeContainer()
+    containers = lambda: {"opps": fake, "state": fake, "views": fake}
+    monkeypatch.setattr(data_access, "cosmos_containers", containers)
+    monkeypatch.setattr(cards, "cosmos_containers", containers)
+    return fake
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """A plain dict standing in for st.session_state"""
+    state = {}
+    monkeypatch.setattr(st, "session_state", state)
+    return state
+
+
+@pytest.fixture
+def no_filters():
+    return {"src": [], "naics": [], "psc": [], "status": [], "procurement": []}
@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+import cache_backend
+from cache_backend import MemoryBackend, SqliteBackend, cached, backend_from_url
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, monkeypatch, tmp_path):
+    if request.param == "memory":
+        instance = MemoryBackend(max_entries=3)
+    else:
+        instance = SqliteBackend(str(tmp_path / "cache.db"), max_entries=3)
+    monkeypatch.setattr(cache_backend, "_backend", instance)
+    return instance
+
+
+def _counting(namespace, **kwargs):
+    calls = []
+
+    @cached(namespace, ttl=60, **kwargs)
+    def fn(x):
+        calls.append(x)
+        return {"x": x}
+
+    return fn, calls
+
+
+def test_hits_skip_the_function(backend):
+    fn, calls = _counting("t")
+    assert fn(1) == fn(1) == {"x": 1}
+    assert calls == [1]
+
+
+def test_clear_one_entry(backend):
+    fn, calls = _counting("t")
+    fn(1), fn(2)
+    fn.clear(1)
+    fn(1), fn(2)
+    assert calls == [1, 2, 1]
+
+
+def test_clear_namespace_bumps_generation(backend):
+    fn, calls = _counting("t")
+    other, other_calls = _counting("u")
+    fn(1), other(1)
+    fn.clear()
+    fn(1), other(1)
+    assert calls == [1, 1]
+    assert other_calls == [1]
+
+
+def test_namespace_cap_evicts_oldest(backend):
+    fn, calls = _counting("t")
+    for x in range(4):
+        fn(x)
+    fn(3), fn(0)
+    assert calls == [0, 1, 2, 3, 0]
+
+
+def test_namespaces_do_not_evict_each_other(backend):
+    detail, detail_calls = _counting("detail", max_entries=2)
+    pages, _ = _counting("pages")
+    detail(1)
+    for x in range(10):
+        pages(x)
+    detail(1)
+    assert detail_calls == [1]
+
+
+def test_exceptions_are_not_cached(backend):
+    attempts = []
+
+    @cached("t", ttl=60)
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        flaky()
+    assert flaky() == "ok"
+    assert len(attempts) == 2
+
+
+def test_sqlite_file_is_shared_between_processes(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    fn, calls = _counting("t")
+    monkeypatch.setattr(cache_backend, "_backend", SqliteBackend(path))
+    fn(1)
+    monkeypatch.setattr(cache_backend, "_backend", SqliteBackend(path))   # another worker process
+    fn(1)
+    assert calls == [1]
+
+
+def test_sqlite_upgrades_a_cache_file_without_namespaces(tmp_path):
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        conn.execute("INSERT INTO cache VALUES ('old', x'01', NULL)")
+    backend = SqliteBackend(path)
+    backend.set("new", b"2", ttl=60, namespace="t", max_entries=1)
+    assert (backend.get("old"), backend.get("new")) == (b"\x01", b"2")
+
+
+@pytest.mark.parametrize("url, kind", [
+    ("", MemoryBackend), ("memory://", MemoryBackend), ("sqlite:///{tmp}/c.db", SqliteBackend),
+])
+def test_backend_from_url(url, kind, tmp_path):
+    assert isinstance(backend_from_url(url.format(tmp=tmp_path)), kind)
+    with pytest.raises(ValueError):
+        backend_from_url("memcached://host")
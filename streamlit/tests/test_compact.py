@@ -0,0 +1,31 @@
+import pandas as pd
+
+from data_access import CATEGORICAL_FIELDS, compact_dataframe, concat_pages
+
+
+def _page(*rows):
+    return compact_dataframe(pd.DataFrame([
+        {"id": opp_id, "title": opp_id, "source": source, "status": None, "procurement": procurement,
+         "unused": "dropped"}
+        for opp_id, source, procurement in rows
+    ]))
+
+
+def test_compaction_drops_unused_columns_and_categorizes_text():
+    page = _page(("A", "SAM.gov", "Solicitation"), ("B", "SAM.gov", None))
+    assert "unused" not in page
+    assert isinstance(page["source"].dtype, pd.CategoricalDtype)
+    assert page["status"].tolist() == ["", ""]
+    assert set(page.attrs["memory"]) == {"before", "after"}
+
+
+def test_procurement_keeps_its_original_values():
+    assert "procurement" not in CATEGORICAL_FIELDS
+    page = _page(("A", "SAM.gov", "Solicitation"), ("B", "SAM.gov", None))
+    assert page["procurement"].tolist() == ["Solicitation", None]
+
+
+def test_pages_with_different_categories_concatenate():
+    merged = concat_pages([_page(("A", "SAM.gov", None)), _page(("B", "GSA eBuy/Task Orders", None))])
+    assert merged["source"].tolist() == ["SAM.gov", "GSA eBuy/Task Orders"]
+    assert isinstance(merged["source"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pandas as pd
+
+from conftest import EPOCH, opp
+from data_access import build_where, fetch_opps, latest_ts, merge_delta, merge_pages
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+def _frame(rows):
+    return pd.DataFrame([{"id": i, "title": t, "_ts": ts} for i, t, ts in rows])
+
+
+def test_merge_delta_updates_in_place_and_appends():
+    df = _frame([("a", "A", 1), ("b", "B", 2), ("c", "C", 3)])
+    delta = _frame([("b", "B2", 5), ("d", "D", 6)])
+    merged, added, updated = merge_delta(df, delta)
+    assert (added, updated) == (1, 1)
+    assert merged["id"].tolist() == ["a", "b", "c", "d"]
+    assert merged["title"].tolist() == ["A", "B2", "C", "D"]
+
+
+def test_merge_delta_keeps_last_duplicate():
+    df = _frame([("a", "A", 1)])
+    delta = _frame([("a", "old", 2), ("a", "new", 3)])
+    merged, added, updated = merge_delta(df, delta)
+    assert (added, updated) == (0, 1)
+    assert merged["title"].tolist() == ["new"]
+
+
+def test_merge_delta_empty_sides():
+    df = _frame([("a", "A", 1)])
+    assert merge_delta(df, pd.DataFrame()) == (df, 0, 0)
+    merged, added, updated = merge_delta(pd.DataFrame(), df)
+    assert (len(merged), added, updated) == (1, 1, 0)
+
+
+def test_merge_pages_skips_rows_already_loaded():
+    df = _frame([("a", "A", 1), ("b", "B", 2)])
+    more = _frame([("b", "B", 2), ("c", "C", 3)])
+    assert merge_pages(df, more)["id"].tolist() == ["a", "b", "c"]
+
+
+def test_latest_ts():
+    assert latest_ts(_frame([("a", "A", 1), ("b", "B", 7)])) == 7
+    assert latest_ts(pd.DataFrame()) is None
+
+
+def test_since_ts_adds_a_write_time_predicate(no_filters):
+    where, params = build_where(START, END, no_filters, since_ts=1750000000)
+    assert where.endswith("AND c._ts > @since")
+    assert {"name": "@since", "value": 1750000000} in params
+
+
+def test_delta_fetch_bypasses_the_result_cache(container, no_filters):
+    container.docs = {"OPP001": opp(1)}
+    fetch_opps(START, END, no_filters)
+    fetch_opps(START, END, no_filters, since_ts=EPOCH + 1)
+    fetch_opps(START, END, no_filters, since_ts=EPOCH + 1)
+    assert ["@since" in str(params) for _, params in container.queries] == [False, True, True]
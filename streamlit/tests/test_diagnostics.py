@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+import streamlit as st
+
+import diagnostics
+from diagnostics import history_frame, recent, track
+
+
+@pytest.fixture
+def in_session(monkeypatch, session):
+    """Pretend every thread runs inside a session script"""
+    monkeypatch.setattr(diagnostics, "get_script_run_ctx", lambda suppress_warning=False: object())
+    return session
+
+
+class _Container:
+    id = "opportunities"
+
+
+def test_hook_sums_every_backend_request_and_skips_the_pager_call(in_session):
+    with track("opps_all", _Container(), filters="naics=2") as call:
+        call.hook({"x-ms-request-charge": "99"}, object())   # query_items' up-front call
+        for charge in ("2.5", "3.25"):
+            call.hook({"x-ms-request-charge": charge, "x-ms-request-duration-ms": "1.5"}, {"Documents": []})
+        call.response(10)
+
+    [stats] = recent()
+    assert (stats.ru, stats.server_ms, stats.requests, stats.pages, stats.items) == (5.75, 3.0, 2, 1, 10)
+    assert datetime.fromisoformat(stats.at).utcoffset().total_seconds() == 0
+
+
+def test_failed_calls_are_recorded_with_their_error(in_session):
+    with pytest.raises(KeyError):
+        with track("detail", _Container(), id="OPP001"):
+            raise KeyError("boom")
+    assert history_frame().loc[0, ["op", "error", "detail"]].tolist() == ["detail", "KeyError", "id=OPP001"]
+
+
+def test_each_session_sees_only_its_own_calls(in_session, monkeypatch):
+    with track("detail", _Container(), id="MINE"):
+        pass
+    monkeypatch.setattr(st, "session_state", {})
+    assert recent() == []
+    with track("detail", _Container(), id="THEIRS"):
+        pass
+    assert [c.detail["id"] for c in recent()] == ["THEIRS"]
+
+
+def test_sessionless_calls_are_only_logged(session):
+    with track("ingest_run", _Container()):
+        pass
+    assert session == {}
+    assert recent() == []
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from conftest import opp
+from export import EXPORT_FIELDS, PARQUET_SCHEMA, export_frame, export_opps, write_export
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+def _page():
+    return pd.DataFrame([
+        {"id": "A", "title": "Alpha", "contractValue": "1500.5", "allNaicsIds": ["541611", "541330"],
+         "postedDate": "2025-06-03T12:00:00Z",
+         "awardDate": {"value": "2025-10-21T00:00:00.000", "deltekEstimate": "true", "govtEstimate": "false"},
+         "solicitationDate": {"value": "2025-07-01T00:00:00.000", "deltekEstimate": "false", "govtEstimate": "false"},
+         "internal": "not exported"},
+        {"id": "B", "title": None, "contractValue": None, "postedDate": "not a date", "awardDate": None},
+    ])
+
+
+def test_export_frame_flattens_to_the_fixed_columns():
+    out = export_frame(_page())
+    assert list(out.columns) == EXPORT_FIELDS
+    assert out["contractValue"].tolist()[0] == 1500.5 and pd.isna(out["contractValue"][1])
+    assert out["allNaicsIds"][0] == "['541611', '541330']"
+    assert out["title"][1] is None
+
+
+def test_govwin_date_objects_become_timestamps_and_estimate_flags():
+    out = export_frame(_page())
+    assert out["awardDate"][0] == pd.Timestamp("2025-10-21")
+    assert out["postedDate"][0] == pd.Timestamp("2025-06-03 12:00")
+    assert pd.isna(out["postedDate"][1])
+    assert out["awardDateEstimated"].tolist()[0] is True
+    assert out["solicitationDateEstimated"][0] == False  # noqa: E712 - nullable boolean
+    assert pd.isna(out["awardDateEstimated"][1])
+
+
+def test_csv_has_a_header_even_without_rows(tmp_path):
+    path = tmp_path / "empty.csv"
+    assert write_export([], str(path), "csv") == 0
+    assert path.read_text().strip().split(",") == EXPORT_FIELDS
+
+
+def test_parquet_pages_share_one_schema(tmp_path):
+    path = tmp_path / "opps.parquet"
+    progress = []
+    assert write_export([_page(), _page().iloc[1:]], str(path), "parquet", progress.append) == 3
+    assert progress == [2, 3]
+    table = pq.read_table(path)
+    assert table.schema.equals(PARQUET_SCHEMA)
+    assert table.column("awardDateEstimated").to_pylist() == [True, None, None]
+
+
+def test_sorted_export_without_the_index_is_written_unsorted(container, no_filters, tmp_path):
+    container.docs = {d["id"]: d for d in (opp(3), opp(1), opp(2))}
+    container.indexed = False
+    path = tmp_path / "opps.csv"
+    assert export_opps(START, END, no_filters, str(path), "csv", sort=("contractValue", False), top=10) == 3
+    assert ["ORDER BY" in q for q, _ in container.queries] == [True, False]
+    assert pd.read_csv(path)["id"].tolist() == ["OPP003", "OPP001", "OPP002"]
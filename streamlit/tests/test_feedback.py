@@ -0,0 +1,36 @@
+import pandas as pd
+
+from cards import save_fb
+from conftest import opp
+
+
+def test_save_is_one_conditional_patch(container, session):
+    container.docs = {"OPP001": opp(1)}
+    doc = save_fb("OPP001", "Yes", "Unrated", etag="etag-1")
+    assert (doc["relevant"], "pursued" in doc) == ("Yes", False)
+    assert doc["_etag"] != "etag-1"
+    assert container.queries == []
+
+
+def test_unrated_feedback_is_not_written(container, session):
+    container.docs = {"OPP001": opp(1)}
+    assert save_fb("OPP001", "Unrated", "Unrated", etag="etag-1") is None
+    assert "relevant" not in container.docs["OPP001"]
+
+
+def test_conflict_refreshes_the_card_from_the_stored_document(container, session):
+    container.docs = {"OPP001": opp(1, relevant="No", _etag="theirs")}
+    session.update({
+        "df": pd.DataFrame([{"id": "OPP001", "relevant": None, "pursued": None, "_etag": "etag-1"}]),
+        "rel_OPP001": "✅ Yes",
+    })
+
+    assert save_fb("OPP001", "Yes", "Unrated", etag="etag-1") is False
+    assert container.docs["OPP001"]["relevant"] == "No"
+    assert session["df"].loc[0, ["relevant", "_etag"]].tolist() == ["No", "theirs"]
+    assert "rel_OPP001" not in session
+    assert "fb_notice_OPP001" in session
+
+
+def test_missing_opportunity_is_reported(container, session):
+    assert save_fb("GONE", "Yes", "Yes", etag="etag-1") is False
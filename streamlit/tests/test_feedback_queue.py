@@ -0,0 +1,45 @@
+import pandas as pd
+from azure.core.exceptions import ServiceRequestError
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from cards import _queue_feedback, flush_feedback_queue
+from conftest import opp
+
+
+def _edit(session, opp_id, rel="✅ Yes", pur=None, etag=None):
+    """Set a card's radios and fire their on_change, as the card does"""
+    session[f"rel_{opp_id}"], session[f"pur_{opp_id}"] = rel, pur
+    _queue_feedback(opp_id, etag)
+
+
+def test_queue_tracks_the_latest_choice_and_drops_unrated(session):
+    _edit(session, "OPP001", etag="etag-1")
+    _edit(session, "OPP001", rel="❌ No", pur="🚀 Yes", etag="etag-1")
+    _edit(session, "OPP002", etag="etag-2")
+    _edit(session, "OPP002", rel=None)
+    assert session["fb_queue"] == {"OPP001": {"relevant": "No", "pursued": "Yes", "etag": "etag-1"}}
+
+
+def test_flush_reports_each_entry_and_keeps_only_failures_queued(container, session):
+    container.docs = {d["id"]: d for d in (opp(1), opp(2), opp(3, _etag="theirs"), opp(4), opp(5))}
+    container.fail_ids = {
+        "OPP004": CosmosHttpResponseError(status_code=503, message="Service unavailable"),
+        "OPP005": ServiceRequestError("connection reset"),
+    }
+    session["df"] = pd.DataFrame([{"id": "OPP001", "relevant": None, "pursued": None, "_etag": "etag-1"}])
+    for n in (1, 2, 3, 4, 5):
+        _edit(session, f"OPP{n:03d}", etag=f"etag-{n}")
+    _edit(session, "GONE", etag="etag-x")
+
+    assert flush_feedback_queue() == {
+        "OPP001": "saved", "OPP002": "saved", "OPP003": "conflict",
+        "OPP004": "error", "OPP005": "error", "GONE": "missing",
+    }
+    assert set(session["fb_queue"]) == {"OPP004", "OPP005"}
+    assert session["df"].loc[0, "relevant"] == "Yes"
+    assert session["df"].loc[0, "_etag"] == container.docs["OPP001"]["_etag"]
+    assert "fb_notice_OPP003" in session
+
+
+def test_empty_queue_flushes_nothing(container, session):
+    assert flush_feedback_queue() == {}
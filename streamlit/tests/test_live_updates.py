@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import EPOCH, opp
+from data_access import _prepare_opps_frame, apply_live_changes, matches_filters, poll_changes
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+@pytest.mark.parametrize("overrides, matches", [
+    ({}, True),
+    ({"naics": ["999999"], "psc": ["R408"]}, True),      # NAICS OR PSC
+    ({"naics": ["999999"]}, False),
+    ({"src": ["govwin tracked"]}, False),
+    ({"src": ["sam.gov"], "status": ["Open"]}, True),
+    ({"procurement": ["Award"]}, False),
+])
+def test_matches_filters_mirrors_build_where(no_filters, overrides, matches):
+    assert matches_filters(opp(1), START, END, {**no_filters, **overrides}) is matches
+
+
+def test_older_documents_fall_back_to_ingested_at_and_nested_naics(no_filters):
+    doc = opp(1, ingestedAtEpoch=None, ingestedAt="2025-07-02T08:00:00", naicsIds=None,
+              allNAICSCodes=[{"id": "541330"}])
+    assert matches_filters(doc, START, datetime(2025, 7, 31), {**no_filters, "naics": ["541330"]})
+    assert not matches_filters(doc, START, END, no_filters)
+    assert not matches_filters(opp(2, ingestedAtEpoch=None, ingestedAt="garbage"), START, END, no_filters)
+
+
+def test_changes_are_added_updated_or_dropped(no_filters):
+    flt = {**no_filters, "status": ["Open"]}
+    df = _prepare_opps_frame([opp(1), opp(2), opp(3)])
+    changes = [opp(2, title="Renamed"), opp(3, status="Closed"), opp(4), opp(5, status="Closed")]
+
+    df, added, updated, removed = apply_live_changes(df, changes, START, END, flt)
+    assert (added, updated, removed) == (1, 1, 1)
+    assert df["id"].tolist() == ["OPP001", "OPP002", "OPP004"]
+    assert df.loc[1, "title"] == "Renamed"
+
+
+def test_polls_resume_from_the_returned_continuation(container):
+    container.docs = {"OPP001": opp(1)}
+    docs, token = poll_changes(None, since_ts=EPOCH)
+    assert [d["id"] for d in docs] == ["OPP001"]
+    container.docs["OPP002"] = opp(2)
+    docs, token = poll_changes(token)
+    assert [d["id"] for d in docs] == ["OPP002"]
+    assert poll_changes(token)[0] == []
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from conftest import EPOCH, opp
+from data_access import PAGE_SIZE, fetch_opps_page, merge_pages
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+def _store(container, count):
+    container.docs = {d["id"]: d for d in (opp(n) for n in range(count))}
+
+
+def test_first_page_is_capped_and_returns_a_cursor(container, no_filters):
+    _store(container, PAGE_SIZE + 5)
+    page, after = fetch_opps_page(START, END, no_filters)
+    assert len(page) == PAGE_SIZE
+    assert after == (EPOCH, page.iloc[-1]["id"])
+    query, params = container.queries[-1]
+    assert query.startswith("SELECT TOP @top ")
+    assert {"name": "@top", "value": PAGE_SIZE + 1} in params
+
+
+def test_short_last_page_ends_paging(container, no_filters):
+    _store(container, 3)
+    page, after = fetch_opps_page(START, END, no_filters)
+    assert len(page) == 3
+    assert after is None
+
+
+def test_pages_are_cached_per_cursor(container, no_filters):
+    _store(container, 3)
+    fetch_opps_page(START, END, no_filters)
+    fetch_opps_page(START, END, no_filters)
+    fetch_opps_page(START, END, no_filters, after=(EPOCH, "OPP002"))
+    assert len(container.queries) == 2
+
+
+def test_load_more_appends_only_new_rows(container, no_filters):
+    _store(container, 4)
+    first, _ = fetch_opps_page(START, END, no_filters, page_size=2)
+    everything, _ = fetch_opps_page(START, END, no_filters, page_size=4)
+    merged = merge_pages(first, everything)
+    assert merged["id"].tolist() == first["id"].tolist() + [
+        i for i in everything["id"] if i not in set(first["id"])
+    ]
+    assert merged["id"].is_unique
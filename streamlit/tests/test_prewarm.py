@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+import prewarm
+from prewarm import Prewarmer
+
+
+@pytest.fixture
+def signals(monkeypatch):
+    """Drive the run:latest document and the date window; count fills and invalidations"""
+    state = {"run": {"completedAt": "2025-06-04T06:00:00Z"}, "day": 4, "invalidated": 0}
+    monkeypatch.setattr(prewarm, "latest_ingest_run", lambda: state["run"])
+    monkeypatch.setattr(prewarm, "default_window", lambda: (datetime(2025, 6, state["day"]),) * 2)
+    monkeypatch.setattr(
+        prewarm, "invalidate_after_ingest", lambda: state.__setitem__("invalidated", state["invalidated"] + 1)
+    )
+    return state
+
+
+def _prewarmer(fills):
+    prewarmer = Prewarmer(poll_seconds=60)
+    prewarmer.fill = lambda: fills.append(prewarmer)
+    return prewarmer
+
+
+def test_fills_at_startup_and_not_again_the_same_day(signals):
+    fills = []
+    prewarmer = _prewarmer(fills)
+    for _ in range(3):
+        prewarmer.poll()
+    assert len(fills) == 1
+    assert signals["invalidated"] == 0
+
+
+def test_new_ingest_run_invalidates_and_fills(signals):
+    fills = []
+    prewarmer = _prewarmer(fills)
+    prewarmer.poll()
+    signals["run"] = {"completedAt": "2025-06-04T12:00:00Z"}
+    prewarmer.poll()
+    prewarmer.poll()
+    assert len(fills) == 2
+    assert signals["invalidated"] == 1
+
+
+def test_day_rollover_fills_again(signals):
+    fills = []
+    prewarmer = _prewarmer(fills)
+    prewarmer.poll()
+    signals["day"] = 5
+    prewarmer.poll()
+    assert len(fills) == 2
+
+
+def test_one_replica_per_shared_cache_does_each_job(signals):
+    fills = []
+    replicas = [_prewarmer(fills), _prewarmer(fills)]
+    for replica in replicas:
+        replica.poll()
+    signals["run"] = {"completedAt": "2025-06-04T12:00:00Z"}
+    for replica in replicas:
+        replica.poll()
+    assert fills == [replicas[0], replicas[0]]
+    assert signals["invalidated"] == 1
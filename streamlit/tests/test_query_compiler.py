@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+from data_access import build_where
+
+START = datetime(2025, 6, 1)
+END = datetime(2025, 6, 30, 23, 59, 59)
+
+
+def _values(params):
+    return {p["name"]: p["value"] for p in params}
+
+
+def test_date_range_only(no_filters):
+    where, params = build_where(START, END, no_filters)
+    assert where == "c.ingestedAtEpoch >= @start AND c.ingestedAtEpoch <= @end"
+    assert _values(params) == {
+        "@start": int(START.replace(tzinfo=timezone.utc).timestamp()),
+        "@end": int(END.replace(tzinfo=timezone.utc).timestamp()),
+    }
+
+
+def test_naics_or_psc_and_operational_filters(no_filters):
+    flt = {**no_filters, "naics": ["541611", "541330"], "psc": ["R408"], "src": ["govwin tracked"], "status": ["Open"]}
+    where, params = build_where(START, END, flt)
+    assert "(ARRAY_CONTAINS_ANY(c.naicsIds, @naics0, @naics1) OR c.pscCode IN (@psc0))" in where
+    assert "c.source IN (@src0)" in where
+    assert "c.status IN (@status0)" in where
+    assert "procurement" not in where
+    values = _values(params)
+    assert values["@naics1"] == "541330"
+    assert values["@src0"] == "GovWin Tracked"
+
+
+def test_single_relevance_filter_is_one_indexed_predicate(no_filters):
+    where, _ = build_where(START, END, {**no_filters, "psc": ["R408", "R499"]})
+    assert where.endswith(" AND (c.pscCode IN (@psc0, @psc1))")
+    assert "ARRAY_CONTAINS" not in where and "allNAICSCodes" not in where
+
+
+def test_parameter_names_never_collide(no_filters):
+    flt = {key: [f"{key}-{i}" for i in range(3)] for key in no_filters}
+    _, params = build_where(START, END, flt)
+    names = [p["name"] for p in params]
+    assert len(names) == len(set(names)) == 2 + 5 * 3
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from conftest import opp
+from data_access import fetch_opps, invalidate_opps_cache, normalize_filters
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+def test_normalize_filters_ignores_order_duplicates_and_source_aliases():
+    a = {"src": ["sam.gov", "GovWin Tracked"], "naics": ["541611", "541330", "541611"]}
+    b = {"naics": ["541330", "541611"], "src": ["govwin tracked", "SAM.gov"], "status": None}
+    assert normalize_filters(a) == normalize_filters(b)
+    assert normalize_filters(a) != normalize_filters({"naics": ["541611"]})
+
+
+def test_equivalent_filters_share_one_query(container):
+    container.docs = {"OPP001": opp(1)}
+    first = fetch_opps(START, END, {"naics": ["541611", "541330"]})
+    second = fetch_opps(START, END, {"naics": ["541330", "541611", "541330"]})
+    assert len(container.queries) == 1
+    assert second["id"].tolist() == first["id"].tolist() == ["OPP001"]
+
+
+def test_invalidation_reaches_the_next_fetch(container, no_filters):
+    container.docs = {"OPP001": opp(1)}
+    fetch_opps(START, END, no_filters)
+    container.docs["OPP002"] = opp(2)
+    assert len(fetch_opps(START, END, no_filters)) == 1
+    invalidate_opps_cache()
+    assert len(fetch_opps(START, END, no_filters)) == 2
+
+
+def test_failed_queries_are_not_cached(container, no_filters):
+    container.docs = {"OPP001": opp(1)}
+    healthy = container.query_items
+
+    def throttled(*args, **kwargs):
+        container.query_items = healthy
+        raise CosmosHttpResponseError(status_code=429, message="Request rate is large")
+
+    container.query_items = throttled
+    assert fetch_opps(START, END, no_filters).empty
+    assert fetch_opps(START, END, no_filters)["id"].tolist() == ["OPP001"]
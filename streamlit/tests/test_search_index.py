@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import data_access
+from conftest import opp
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / "search.db"))
+
+
+def test_title_and_tag_hits_rank_above_description_hits(index):
+    index.upsert_many([
+        opp(1, title="Cyber assessment", description="<p>Network security review</p>"),
+        opp(2, title="Security guard services", smartTagObject=[{"name": "Physical Security"}]),
+        {"title": "no id, skipped"},
+    ])
+    assert [opp_id for opp_id, _ in index.search("security")] == ["OPP002", "OPP001"]
+    assert index.search("<p>") == []
+
+
+def test_upsert_replaces_the_previous_version(index):
+    index.upsert_many([opp(1, title="Janitorial services")])
+    index.upsert_many([opp(1, title="Landscaping services")])
+    assert index.count() == 1
+    assert index.search("janitorial") == []
+
+
+def test_user_input_is_never_parsed_as_fts_syntax(index):
+    assert SearchIndex.to_match_query('cloud OR "data center" NEAR(x') == '"cloud" "OR" "data center" "NEAR(x"'
+    index.upsert_many([opp(1, title="Data center OR cloud")])
+    assert len(index.search('cloud OR "data center" NEAR(x')) == 0
+    assert len(index.search('"data center" cloud')) == 1
+
+
+def test_sync_resumes_from_the_saved_continuation(index, container):
+    container.docs = {d["id"]: d for d in (opp(1, title="Radar upgrade"), opp(2, title="Radio spares"))}
+    assert not index.ready
+    assert index.sync(container) == 2
+    assert index.ready
+    assert index.sync(container) == 0
+    container.docs["OPP003"] = opp(3, title="Radar maintenance")
+    assert index.sync(container) == 1
+    assert {opp_id for opp_id, _ in index.search("radar")} == {"OPP001", "OPP003"}
+
+
+def test_history_search_uses_the_loaded_results_until_the_index_is_built(index, monkeypatch):
+    builds = []
+    monkeypatch.setattr(data_access, "search_index", lambda: index)
+    monkeypatch.setattr(data_access, "start_search_index_build", lambda: builds.append(1))
+    loaded = pd.DataFrame({"id": ["A", "B"], "searchText": ["radar upgrade", "radio spares"]})
+
+    result = data_access.search_history("radar", loaded=loaded)
+    assert result["id"].tolist() == ["A"]
+    assert builds == [1]
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from data_access import build_search_text, search_mask
+
+
+def _frame():
+    df = pd.DataFrame({
+        "title": ["Background Investigation Services", "Cloud Migration", "Audit Support"],
+        "agency": ["OPM", "GSA", None],
+        "pscCode": ["R408", "D302", "R418"],
+        "description": ["<p>Personnel <b>security</b> checks</p>", "Move to the cloud", None],
+    })
+    df["searchText"] = build_search_text(df)
+    return df
+
+
+def test_search_text_is_lowercase_without_html_or_missing_values():
+    text = _frame()["searchText"]
+    assert text[0] == "background investigation services opm r408 personnel security checks"
+    assert text[2] == "audit support r418"
+
+
+def test_every_term_must_match():
+    df = _frame()
+    assert search_mask(df, "CLOUD gsa").tolist() == [False, True, False]
+    assert not search_mask(df, "cloud opm").any()
+
+
+def test_quoted_phrases_match_as_a_whole():
+    df = _frame()
+    assert search_mask(df, '"security checks"').tolist() == [True, False, False]
+    assert not search_mask(df, '"checks security"').any()
+
+
+def test_frames_without_search_text_are_not_filtered():
+    df = _frame().drop(columns="searchText")
+    assert search_mask(df, "anything").all()
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import opp
+from data_access import _query_opps_page, build_keyset, build_order_by, build_query
+
+START = datetime(2025, 6, 1)
+END = datetime(2025, 6, 30, 23, 59, 59)
+
+VALUES = [None, 100.0, 250.0, 250.0, None, 5e6, 100.0, 250.0, None, 42.0, 250.0]
+
+
+def _values(params):
+    return {p["name"]: p["value"] for p in params}
+
+
+@pytest.mark.parametrize("ascending, direction", [(False, "DESC"), (True, "ASC")])
+def test_order_by_breaks_ties_on_id(ascending, direction):
+    assert build_order_by("contractValue", ascending) == f"ORDER BY c.contractValue {direction}, c.id {direction}"
+    assert build_order_by("ingestedAt", ascending) == f"ORDER BY c.ingestedAtEpoch {direction}, c.id {direction}"
+
+
+def test_query_top_and_order(no_filters):
+    query, params = build_query(START, END, no_filters, sort_by="postedDate", top=100)
+    assert query.startswith("SELECT TOP @top c.id, ")
+    assert query.endswith("ORDER BY c.postedDate DESC, c.id DESC")
+    assert _values(params)["@top"] == 100
+
+
+def test_query_unsorted_has_no_order_by(no_filters):
+    query, _ = build_query(START, END, no_filters)
+    assert "ORDER BY" not in query and "TOP" not in query
+
+
+def test_query_keyset_goes_before_order_by(no_filters):
+    query, params = build_query(START, END, no_filters, sort_by="contractValue", top=51, after=(250.0, "OPP-9"))
+    where = query.split(" WHERE ", 1)[1]
+    assert where.index("@afterValue") < where.index("ORDER BY")
+    assert _values(params)["@afterValue"] == 250.0
+    assert _values(params)["@afterId"] == "OPP-9"
+
+
+@pytest.mark.parametrize("ascending, value, expected", [
+    (False, 5.0, "(c.contractValue < @afterValue OR (c.contractValue = @afterValue AND c.id < @afterId) "
+                 "OR IS_NULL(c.contractValue))"),
+    (True, 5.0, "(c.contractValue > @afterValue OR (c.contractValue = @afterValue AND c.id > @afterId))"),
+    (False, None, "(IS_NULL(c.contractValue) AND c.id < @afterId)"),
+    (True, None, "((IS_NULL(c.contractValue) AND c.id > @afterId) OR NOT IS_NULL(c.contractValue))"),
+])
+def test_keyset_predicates(ascending, value, expected):
+    params = []
+    assert build_keyset("contractValue", ascending, (value, "X"), params) == expected
+    assert ("@afterValue" in _values(params)) == (value is not None)
+
+
+@pytest.fixture
+def unindexed(container):
+    """Values with ties and nulls, in a container that rejects ORDER BY like Cosmos without the composite index"""
+    container.docs = {d["id"]: d for d in (opp(n, contractValue=v) for n, v in enumerate(VALUES))}
+    container.indexed = False
+    return container
+
+
+@pytest.mark.parametrize("ascending", [False, True])
+def test_keyset_pages_cover_every_row_once_in_order(unindexed, no_filters, ascending):
+    ids, after = [], None
+    while True:
+        page, after = _query_opps_page(START, END, no_filters, after, 3, "contractValue", ascending)
+        ids += page["id"].tolist()
+        if after is None:
+            break
+    # Cosmos order: nulls sort first ascending and last descending, ties by id
+    expected = sorted(
+        unindexed.docs.values(),
+        key=lambda d: (d["contractValue"] is not None, d["contractValue"] or 0, d["id"]),
+        reverse=not ascending,
+    )
+    assert ids == [d["id"] for d in expected]
+
+
+def test_last_full_page_has_no_cursor(unindexed, no_filters):
+    page, after = _query_opps_page(START, END, no_filters, None, len(VALUES), "contractValue", False)
+    assert len(page) == len(VALUES)
+    assert after is None
+
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from data_access import VALUE_EXPR, build_aggregate_queries, build_where, fetch_summary
+
+START, END = datetime(2025, 6, 1), datetime(2025, 6, 30)
+
+
+def test_aggregates_share_the_list_filters(no_filters):
+    flt = {**no_filters, "psc": ["R408"]}
+    where, params = build_where(START, END, flt)
+    queries = build_aggregate_queries(START, END, flt)
+    assert queries == {
+        "count": (f"SELECT VALUE COUNT(1) FROM c WHERE {where}", params),
+        "total_value": (f"SELECT VALUE SUM({VALUE_EXPR}) FROM c WHERE {where}", params),
+    }
+
+
+def _partials(count, total):
+    """One partial aggregate per physical partition, as cross-partition queries return them"""
+    return lambda query, params: count if "COUNT(1)" in query else total
+
+
+def test_partial_aggregates_are_summed(container, no_filters):
+    container.answer = _partials([3, 2], [100.0, 50.5, None])
+    assert fetch_summary(START, END, no_filters) == {"count": 5, "total_value": 150.5, "avg_value": 30.1}
+
+
+def test_empty_result_has_zero_average(container, no_filters):
+    container.answer = _partials([0], [])
+    assert fetch_summary(START, END, no_filters) == {"count": 0, "total_value": 0, "avg_value": 0.0}
+
+
+def test_summary_is_cached_until_refreshed(container, no_filters):
+    container.answer = _partials([1], [10.0])
+    fetch_summary(START, END, no_filters)
+    container.answer = _partials([2], [30.0])
+    assert fetch_summary(START, END, no_filters)["count"] == 1
+    assert fetch_summary(START, END, no_filters, refresh=True)["count"] == 2
+
+
+def test_failed_aggregates_return_none(container, no_filters):
+    def fail(query, params):
+        raise CosmosHttpResponseError(status_code=500, message="boom")
+
+    container.answer = fail
+    assert fetch_summary(START, END, no_filters) is None
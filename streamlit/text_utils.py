@@ -0,0 +1,11 @@
+"""
+Text helpers shared by search_mask (data_access.py) and the full-text index
+(search_index.py), so in-page search and history search tokenize alike.
+"""
+
+import re
+
+HTML_TAG = re.compile(r"<[^>]+>")
+
+# A "quoted phrase" (group 1) or a bare word (group 2)
+SEARCH_TERM = re.compile(r'"([^"]+)"|(\S+)')